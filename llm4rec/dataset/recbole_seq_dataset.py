@@ -13,7 +13,8 @@ class RecboleSeqDataset(SequentialDataset):
         dataset_name (str): The name of the dataset.
         id_token (List[str]): The mapping from internal numerical item ids to item ids from dataset file.
         preprocess_text_fn (Callable): The function to transform text feature of an item.
-        item_text (Dict[int, str]): The mapping from internal numerical id of item to items text feature.
+        item_attr (Dict[int, Dict[str, str]]): The mapping from internal numerical id of item to item attributes.
+        item_text (np.ndarray): Pre-rendered texts of items indexed by internal numerical id of item.
     """
     def __init__(
         self, config: tp.Dict[str, tp.Any], preprocess_text_fn: tp.Callable = None
@@ -33,6 +34,7 @@ class RecboleSeqDataset(SequentialDataset):
         self.preprocess_text_fn = preprocess_text_fn
         self.user_text = self.load_user_text()
         self.item_attr = self.load_item_text()
+        self.item_text = self.render_item_text()
 
     def load_user_text(self) -> tp.List[str]:
         # from internal ids to text
@@ -110,6 +112,13 @@ class RecboleSeqDataset(SequentialDataset):
             item_attr[i] = raw_attr
         return item_attr
     
+    def render_item_text(self) -> np.ndarray:
+        # texts of all items are rendered once, so text lookups are a single gather by internal ids
+        item_text = np.full(len(self.item_id_token), "", dtype=object)
+        for item_id, attr in self.item_attr.items():
+            item_text[item_id] = "; ".join([f'{attr_key}:{attr[attr_key]}' for attr_key in attr])
+        return item_text
+
     def user_id2text(self, id: int) -> str:
         # internal id to text
         return self.user_text[id]
@@ -120,13 +129,25 @@ class RecboleSeqDataset(SequentialDataset):
     
     def item_id2text(self, id: int) -> str:
         # internal id to text
-        attr = self.item_attr[id]
-        text = "; ".join([f'{attr_key}:{attr[attr_key]}' for attr_key in attr])
-        return text#self.item_text[id]
+        return self.item_text[id]
+
+    def items2text(self, ids: tp.Sequence[int]) -> tp.List[str]:
+        """
+        Return texts of items by their internal ids with one vectorized lookup.
+        """
+        return self.item_text[np.asarray(ids, dtype=np.int64)].tolist()
         
     def item_token2text(self, token: str) -> str:
         internal_id = self.token2id('item_id', token)
         return self.item_id2text(internal_id)
+
+    def item_tokens2text(self, tokens: tp.Sequence[str]) -> tp.List[str]:
+        """
+        Return texts of items by their tokens from dataset file, bulk version of item_token2text.
+        """
+        if len(tokens) == 0:
+            return []
+        return self.items2text(self.token2id('item_id', list(tokens)))
         
     def item_token2attr(self, token: str) -> str:
         internal_id = self.token2id('item_id', token)
@@ -1,5 +1,14 @@
 from llm4rec.evaluation import evaluate
+from llm4rec.evaluation.recommendation_store import RecommendationStore
+from llm4rec.evaluation.offline import save_recommendations, evaluate_recommendations
+from llm4rec.evaluation.sampled import stratified_order, per_user_metrics, stratified_bootstrap
 
 __all__ = [
-    "evaluate"
+    "evaluate",
+    "RecommendationStore",
+    "save_recommendations",
+    "evaluate_recommendations",
+    "stratified_order",
+    "per_user_metrics",
+    "stratified_bootstrap"
 ]
\ No newline at end of file
@@ -11,7 +11,13 @@ import typing as tp
 import os
 from dotenv import load_dotenv
 
-def evaluate_pipeline(config: Config, dataset: Dataset, tasks: tp.List[tp.Union[Recommender, ItemAugmentation, UserAugmentation]]):
+def evaluate_pipeline(
+    config: Config,
+    dataset: Dataset,
+    tasks: tp.List[tp.Union[Recommender, ItemAugmentation, UserAugmentation]],
+    store_path: str = None,
+    dump_path: str = None,
+):
     _, _, test_data = data_preparation(config, dataset)
 
     model = RecBolePipelineRecommender(config=config,
@@ -20,7 +26,42 @@ def evaluate_pipeline(config: Config, dataset: Dataset, tasks: tp.List[tp.Union[
                                     verbose=False)
 
     trainer = PipelineTrainer(config, model)
-    test_result = trainer.evaluate(test_data, show_progress=config['show_progress'])
+    # recommendations are persisted to the store, so a rerun with the same path and pipeline resumes the evaluation,
+    # ranked lists are saved to the dump for offline metric computation with evaluate_recommendations
+    test_result = trainer.evaluate(
+        test_data, show_progress=config['show_progress'], store_path=store_path, dump_path=dump_path
+    )
+
+    return config['model'], config['dataset'], {
+        'valid_score_bigger': config['valid_metric_bigger'],
+        'test_result': test_result
+    }
+
+
+def evaluate_pipeline_sampled(
+    config: Config,
+    dataset: Dataset,
+    tasks: tp.List[tp.Union[Recommender, ItemAugmentation, UserAugmentation]],
+    max_ci_width: float = 0.02,
+    confidence: float = 0.95,
+    **kwargs: tp.Any,
+):
+    """
+    Evaluate pipeline on stratified sample of test users with early stopping by the width
+    of bootstrap confidence interval. Additional arguments are passed to PipelineTrainer.evaluate_sampled.
+    """
+    _, _, test_data = data_preparation(config, dataset)
+
+    model = RecBolePipelineRecommender(config=config,
+                                    dataset=dataset,
+                                    tasks=tasks, 
+                                    verbose=False)
+
+    trainer = PipelineTrainer(config, model)
+    kwargs.setdefault('user_activity', dataset.counter('user_id'))
+    test_result = trainer.evaluate_sampled(
+        test_data, max_ci_width=max_ci_width, confidence=confidence, show_progress=config['show_progress'], **kwargs
+    )
 
     return config['model'], config['dataset'], {
         'valid_score_bigger': config['valid_metric_bigger'],
@@ -49,10 +90,11 @@ if __name__ == "__main__":
     retrieval = RetrievalRecommender(
                 embeddings=None,
                 item2text=dataset.item_token2text,
+                items2text=dataset.item_tokens2text,
                 items_info_path=os.path.join(config['data_path'], f"{config['dataset']}.item"),
                 search_kwargs={'k':max(config['topk'])})
     
-    ranking = RankerRecommender(llm=llm, item2text=dataset.item_token2text)
+    ranking = RankerRecommender(llm=llm, item2text=dataset.item_token2text, items2text=dataset.item_tokens2text)
     tasks = [retrieval, ranking]
     
     result = evaluate_pipeline(config, dataset, tasks)
@@ -0,0 +1,94 @@
+import os
+import copy
+import typing as tp
+from collections import OrderedDict
+
+import numpy as np
+import torch
+from recbole.evaluator.collector import DataStruct
+from recbole.evaluator.evaluator import Evaluator
+from recbole.evaluator.register import Register
+
+from llm4rec.evaluation.topk import topk_from_candidates
+
+
+def save_recommendations(
+    path: str, batches: tp.List[tp.Tuple[torch.Tensor, torch.Tensor, torch.Tensor]], n_items: int
+) -> None:
+    """
+    Save ranked candidates and positive items of evaluated users to compressed NPZ file.
+
+    Args:
+        path (str): The path to NPZ file.
+        batches (List[Tuple[torch.Tensor, torch.Tensor, torch.Tensor]]): Ranked candidate ids of users
+            padded with -1, row indices and internal item ids of positive pairs for each batch.
+        n_items (int): The number of items in dataset.
+    """
+    width = max([0] + [matrix.shape[1] for matrix, _, _ in batches])
+    candidates = np.full((sum(matrix.shape[0] for matrix, _, _ in batches), width), -1, dtype=np.int64)
+    rows, items = [], []
+    offset = 0
+    for matrix, batch_u, batch_i in batches:
+        candidates[offset : offset + matrix.shape[0], : matrix.shape[1]] = matrix.cpu().numpy()
+        rows.append(batch_u.cpu().numpy().astype(np.int64) + offset)
+        items.append(batch_i.cpu().numpy().astype(np.int64))
+        offset += matrix.shape[0]
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(
+        path,
+        candidates=candidates,
+        positive_u=np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64),
+        positive_i=np.concatenate(items) if items else np.zeros(0, dtype=np.int64),
+        n_items=np.array(n_items),
+    )
+
+
+def evaluate_recommendations(
+    path: str, config: tp.Any, metrics: tp.List[str] = None, topk: tp.List[int] = None
+) -> tp.OrderedDict[str, float]:
+    """
+    Compute RecBole metrics from recommendations saved by save_recommendations (e.g. with eval_dump_path
+    of PipelineTrainer) without running the models again. Metrics are computed from top-k hits,
+    so only metrics which need 'rec.topk' data are available (Recall, NDCG, Hit, MRR, Precision, MAP).
+
+    Args:
+        path (str): The path to NPZ file.
+        config (Config): RecBole config.
+        metrics (List[str], optional): Metrics to compute. Defaults to metrics of config.
+        topk (List[int], optional): Cut-offs of metrics, they should not exceed the saved list length.
+            Defaults to topk of config.
+
+    Returns:
+        OrderedDict[str, float]: The values of metrics.
+    """
+    config = copy.deepcopy(config)
+    if metrics is not None:
+        config["metrics"] = metrics
+    if topk is not None:
+        config["topk"] = topk
+
+    unsupported = [key for key in ["rec.items", "rec.meanrank", "rec.score", "data.label"] if Register(config).need(key)]
+    if len(unsupported) > 0:
+        raise ValueError(
+            f"Metrics could be computed only from top-k hits. Got metrics which need: {unsupported}"
+        )
+
+    with np.load(path) as data:
+        candidates = torch.from_numpy(data["candidates"])
+        positive_u = torch.from_numpy(data["positive_u"])
+        positive_i = torch.from_numpy(data["positive_i"])
+        n_items = int(data["n_items"])
+
+    max_k = max(config["topk"])
+    if candidates.shape[1] < max_k:
+        # positions after the saved lists are misses
+        padding = torch.full((candidates.shape[0], max_k - candidates.shape[1]), -1, dtype=torch.long)
+        candidates = torch.cat((candidates, padding), dim=1)
+
+    struct = DataStruct()
+    struct.set("rec.topk", topk_from_candidates(candidates, positive_u, positive_i, max_k, n_items))
+    struct.set("data.num_items", n_items)
+    struct.set("data.num_users", candidates.shape[0])
+    return OrderedDict(Evaluator(config).evaluate(struct))
@@ -0,0 +1,175 @@
+import os
+import json
+import hashlib
+import threading
+import typing as tp
+
+from llm4rec.tasks.base_recommender import Recommender
+
+
+# attributes naming the model of LLM, embeddings or transformers model and tokenizer
+_MODEL_NAME_ATTRIBUTES = ["model_name", "model", "model_id", "repo_id", "name_or_path"]
+# attributes of prompts, generation and text splitting which change recommendations
+_CONFIG_ATTRIBUTES = ["template", "temperature", "max_tokens", "seed", "top_p", "_chunk_size", "_chunk_overlap", "_separator"]
+_MAX_DEPTH = 6
+
+
+def _safe_getattr(value: tp.Any, attr: str) -> tp.Any:
+    try:
+        return getattr(value, attr, None)
+    except Exception:
+        return None
+
+
+def _describe_task(task: tp.Any, depth: int = 0) -> tp.Dict[str, tp.Any]:
+    return {
+        "class": type(task).__name__,
+        **{
+            name: _describe(value, depth + 1)
+            for name, value in sorted(vars(task).items())
+            if not name.startswith("_") and name not in getattr(task, "runtime_attributes", [])
+        },
+    }
+
+
+def _describe(value: tp.Any, depth: int = 0) -> tp.Any:
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if depth > _MAX_DEPTH:
+        return type(value).__name__
+    if isinstance(value, dict):
+        return {str(key): _describe(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_describe(item, depth + 1) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted([_describe(item, depth + 1) for item in value], key=lambda item: json.dumps(item, default=str))
+    # nested recommenders, e.g. ranker and scorer of CascadeRanker
+    if isinstance(value, Recommender):
+        return _describe_task(value, depth)
+
+    # other objects (LLMs, embeddings, prompt templates, text splitters) are described by their class,
+    # model name and the settings which change their output
+    description = {"class": type(value).__name__}
+    for attr in _MODEL_NAME_ATTRIBUTES:
+        model_name = _safe_getattr(value, attr)
+        if isinstance(model_name, str):
+            description["model_name"] = model_name
+            break
+    else:
+        model_name = _safe_getattr(_safe_getattr(value, "config"), "_name_or_path")
+        if isinstance(model_name, str):
+            description["model_name"] = model_name
+    for attr in _CONFIG_ATTRIBUTES:
+        attr_value = _safe_getattr(value, attr)
+        if isinstance(attr_value, (str, int, float, bool)):
+            description[attr.lstrip("_")] = attr_value
+    return description
+
+
+def pipeline_fingerprint(tasks: tp.List[tp.Any], top_k: int) -> str:
+    """
+    Build fingerprint of recommendation pipeline from classes of tasks and their public attributes: scalars,
+    dicts and lists are serialized recursively, nested recommenders are described as tasks, other objects
+    by model name and settings (prompt templates, generation parameters, text splitting).
+    Attributes listed in runtime_attributes of task (e.g. token counters) are skipped.
+
+    Args:
+        tasks (List[Any]): The tasks of pipeline or the recommender itself.
+        top_k (int): The number of recommended items.
+
+    Returns:
+        str: The hash of the pipeline description.
+    """
+    description = {"tasks": [_describe_task(task) for task in tasks], "top_k": top_k}
+    serialized = json.dumps(description, sort_keys=True, default=str)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+
+class RecommendationStore:
+    """
+    Append-only JSONL store of recommendation lists of users. Every computed list is written and flushed
+    at once, so an interrupted evaluation could be restarted and users already stored are not recomputed.
+    The first line is the header with the fingerprint of pipeline, so recommendations of one pipeline
+    are never returned for another one.
+
+    Attributes:
+        path (str): The path to JSONL file.
+        fingerprint (Optional[str]): The fingerprint of pipeline which computed the recommendations.
+    """
+
+    def __init__(self, path: str, fingerprint: str = None) -> None:
+        """
+        Initializes RecommendationStore and loads recommendations stored by previous runs.
+
+        Args:
+            path (str): The path to JSONL file. It is created if it does not exist.
+            fingerprint (str, optional): The fingerprint of pipeline, e.g. from pipeline_fingerprint.
+                The existing store is resumed only if its header has the same fingerprint. Defaults to None (not checked).
+        """
+        self.path = path
+        self.fingerprint = fingerprint
+        self._lock = threading.Lock()
+        self._records = {}
+        header = None
+        ends_with_newline = True
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    ends_with_newline = line.endswith("\n")
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # the last line could be cut by the crash of previous run
+                        continue
+                    if "header" in record:
+                        header = record["header"]
+                        continue
+                    self._records[record["key"]] = record["recommendations"]
+        if fingerprint is not None and (header is not None or len(self._records) > 0):
+            stored_fingerprint = header.get("fingerprint") if header is not None else None
+            if stored_fingerprint != fingerprint:
+                raise ValueError(
+                    f"The recommendation store {path} was written by another pipeline or top_k. "
+                    + "Use another store path or remove the store."
+                )
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        if not ends_with_newline:
+            # new records should not be appended to the cut line
+            self._file.write("\n")
+        if header is None and len(self._records) == 0:
+            self._file.write(json.dumps({"header": {"fingerprint": fingerprint}}) + "\n")
+            self._file.flush()
+
+    @staticmethod
+    def make_key(user_token_id: str, prev_interactions: tp.List[str]) -> str:
+        """
+        Build key of evaluated interaction from user and the history, so different evaluation steps
+        of the same user (e.g. validation and test) are stored separately.
+        """
+        history_hash = hashlib.sha1(" ".join(str(item) for item in prev_interactions).encode("utf-8")).hexdigest()
+        return f"{user_token_id}:{history_hash[:16]}"
+
+    def get(self, key: str) -> tp.Optional[tp.List[str]]:
+        with self._lock:
+            return self._records.get(key)
+
+    def add(self, key: str, recommendations: tp.List[tp.Any], **metadata: tp.Any) -> None:
+        recommendations = [str(item) for item in recommendations]
+        line = json.dumps({"key": key, "recommendations": recommendations, **metadata})
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._records[key] = recommendations
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._records
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._records)
+
+    def close(self) -> None:
+        self._file.close()
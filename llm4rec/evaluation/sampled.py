@@ -0,0 +1,109 @@
+import inspect
+import typing as tp
+
+import numpy as np
+import torch
+from recbole.evaluator.collector import DataStruct
+from recbole.evaluator.register import metrics_dict
+
+
+def stratified_order(
+    history_lengths: np.ndarray, activity: np.ndarray, n_strata: int = 4, seed: int = 2024
+) -> tp.Tuple[np.ndarray, np.ndarray]:
+    """
+    Order users so that every prefix of the order is close to proportional stratified sample.
+    Users are stratified by quantiles of history length and activity, shuffled inside strata
+    and strata are interleaved proportionally to their sizes.
+
+    Args:
+        history_lengths (np.ndarray): The length of history of each user.
+        activity (np.ndarray): The number of interactions of each user in dataset.
+        n_strata (int): The number of quantile bins of each feature, so there are up to n_strata ** 2 strata.
+        seed (int): The seed of shuffling.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The order of users and the stratum of each user.
+    """
+    def quantile_bins(values: np.ndarray) -> np.ndarray:
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, n_strata + 1)[1:-1]))
+        return np.searchsorted(edges, values, side="right")
+
+    strata = quantile_bins(np.asarray(history_lengths)) * (n_strata + 1) + quantile_bins(np.asarray(activity))
+    _, strata = np.unique(strata, return_inverse=True)
+
+    rng = np.random.default_rng(seed)
+    keys = np.empty(len(strata), dtype=np.float64)
+    for stratum in np.unique(strata):
+        members = np.flatnonzero(strata == stratum)
+        # the i-th user of stratum of size n is placed at the fraction (i + u) / n of the order
+        keys[rng.permutation(members)] = (np.arange(len(members)) + rng.random(len(members))) / len(members)
+    return np.argsort(keys, kind="stable"), strata
+
+
+def per_user_metrics(config: tp.Any, topk_data: torch.Tensor) -> tp.Dict[str, np.ndarray]:
+    """
+    Compute values of top-k metrics of config for each user.
+
+    Args:
+        config (Config): RecBole config with metrics and topk.
+        topk_data (torch.Tensor): 'rec.topk' data: top-k hits concatenated with the number of positives.
+
+    Returns:
+        Dict[str, np.ndarray]: The values for each user by metric name in RecBole format, e.g. 'ndcg@10'.
+    """
+    struct = DataStruct()
+    struct.set("rec.topk", topk_data)
+    values = {}
+    for metric_name in config["metrics"]:
+        metric = metrics_dict[metric_name.lower()](config)
+        pos_index, pos_len = metric.used_info(struct)
+        # some metrics do not need the number of positives
+        if len(inspect.signature(metric.metric_info).parameters) > 1:
+            metric_matrix = metric.metric_info(pos_index, pos_len)
+        else:
+            metric_matrix = metric.metric_info(pos_index)
+        for k in config["topk"]:
+            values[f"{metric_name.lower()}@{k}"] = metric_matrix[:, k - 1]
+    return values
+
+
+def stratified_bootstrap(
+    values: np.ndarray,
+    strata: np.ndarray,
+    strata_weights: tp.Dict[int, float],
+    n_bootstrap: int = 1000,
+    confidence: float = 0.95,
+    seed: int = 2024,
+) -> tp.Tuple[float, float, float]:
+    """
+    Estimate the mean over population from stratified sample with bootstrap confidence interval.
+    Users are resampled inside strata and strata means are weighted by the population share of strata.
+
+    Args:
+        values (np.ndarray): The metric values of sampled users.
+        strata (np.ndarray): The stratum of each sampled user.
+        strata_weights (Dict[int, float]): The share of each stratum in the population.
+        n_bootstrap (int): The number of bootstrap resamples.
+        confidence (float): The confidence level of the interval.
+        seed (int): The seed of resampling.
+
+    Returns:
+        Tuple[float, float, float]: The estimate, the lower and the upper bounds of the interval.
+    """
+    rng = np.random.default_rng(seed)
+    sampled_strata = np.unique(strata)
+    # strata without sampled users are not represented, the weights are renormalized
+    total_weight = sum(strata_weights[stratum] for stratum in sampled_strata)
+
+    estimate = 0.0
+    resampled_means = np.zeros(n_bootstrap)
+    for stratum in sampled_strata:
+        stratum_values = values[strata == stratum]
+        weight = strata_weights[stratum] / total_weight
+        estimate += weight * stratum_values.mean()
+        resample_idx = rng.integers(0, len(stratum_values), size=(n_bootstrap, len(stratum_values)))
+        resampled_means += weight * stratum_values[resample_idx].mean(axis=1)
+
+    alpha = (1.0 - confidence) / 2
+    low, high = np.quantile(resampled_means, [alpha, 1.0 - alpha])
+    return float(estimate), float(low), float(high)
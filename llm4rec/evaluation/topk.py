@@ -0,0 +1,71 @@
+import typing as tp
+
+import torch
+
+
+def candidates_to_matrix(candidate_ids: tp.List[tp.Sequence[int]], min_width: int = 0) -> torch.Tensor:
+    """
+    Pack ranked candidate lists of users into matrix padded with -1. Repeated candidates keep
+    their first position and the padding item 0 is dropped, as in dense scores where the first
+    occurrence has the highest score and item 0 is masked.
+
+    Args:
+        candidate_ids (List[Sequence[int]]): Internal ids of ranked candidates of each user.
+        min_width (int): The minimum number of columns, e.g. max(topk) of evaluation.
+
+    Returns:
+        torch.Tensor: The matrix of shape (n_users, max(min_width, longest list)).
+    """
+    rows = [list(dict.fromkeys(int(item_id) for item_id in row if int(item_id) != 0)) for row in candidate_ids]
+    width = max([min_width] + [len(row) for row in rows])
+    matrix = torch.full((len(rows), width), -1, dtype=torch.long)
+    for row_idx, row in enumerate(rows):
+        matrix[row_idx, : len(row)] = torch.tensor(row, dtype=torch.long)
+    return matrix
+
+
+def candidates_to_scores(candidate_matrix: torch.Tensor, n_items: int, fill_value: float = -10000.0) -> torch.Tensor:
+    """
+    Build dense scores from the candidate matrix with one vectorized scatter. Candidates get
+    decreasing scores by rank, other items get fill_value.
+
+    Returns:
+        torch.Tensor: The scores of shape (n_users, n_items).
+    """
+    num_users, width = candidate_matrix.shape
+    scores = torch.full((num_users, n_items), fill_value)
+    rank_scores = (width - torch.arange(width, dtype=torch.float)).expand(num_users, width)
+    valid = candidate_matrix >= 0
+    rows = torch.arange(num_users).unsqueeze(1).expand(num_users, width)
+    scores[rows[valid], candidate_matrix[valid]] = rank_scores[valid]
+    return scores
+
+
+def topk_from_candidates(
+    candidate_matrix: torch.Tensor, positive_u: torch.Tensor, positive_i: torch.Tensor, k: int, n_items: int
+) -> torch.Tensor:
+    """
+    Build 'rec.topk' data of RecBole collector directly from ranked candidates without dense scores.
+    Positions after the end of candidate list are counted as misses.
+
+    Args:
+        candidate_matrix (torch.Tensor): Ranked candidates of shape (n_users, width >= k) padded with -1.
+        positive_u (torch.Tensor): Row indices of positive pairs.
+        positive_i (torch.Tensor): Internal item ids of positive pairs.
+        k (int): The number of top positions, max(topk) of evaluation.
+        n_items (int): The number of items in dataset.
+
+    Returns:
+        torch.Tensor: The hit matrix of top k positions concatenated with the number of positives,
+            shape (n_users, k + 1).
+    """
+    num_users = candidate_matrix.shape[0]
+    top_candidates = candidate_matrix[:, :k]
+    positive_u = positive_u.long().cpu()
+    positive_i = positive_i.long().cpu()
+    # pairs are encoded as single integers to test membership in one call
+    candidate_codes = torch.arange(num_users).unsqueeze(1) * n_items + top_candidates
+    positive_codes = positive_u * n_items + positive_i
+    pos_idx = (torch.isin(candidate_codes, positive_codes) & (top_candidates >= 0)).long()
+    pos_len = torch.bincount(positive_u, minlength=num_users).unsqueeze(1)
+    return torch.cat((pos_idx, pos_len), dim=1)
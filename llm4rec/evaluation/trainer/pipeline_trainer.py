@@ -3,6 +3,12 @@ from recbole.utils import EvaluatorType, set_color
 from recbole.model.abstract_recommender import AbstractRecommender
 from recbole.data.dataloader import AbstractDataLoader
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
+from llm4rec.evaluation.recommendation_store import RecommendationStore, pipeline_fingerprint
+from llm4rec.evaluation.topk import candidates_to_matrix, candidates_to_scores, topk_from_candidates
+from llm4rec.evaluation.offline import save_recommendations
+from llm4rec.evaluation.sampled import stratified_order, per_user_metrics, stratified_bootstrap
+from collections import OrderedDict
 import torch
 import numpy as np
 import typing as tp
@@ -11,14 +17,106 @@ import typing as tp
 class PipelineTrainer(Trainer):
     """
     A tool for running training and evaluation of pipeline
+
+    Attributes:
+        recommendation_store (Optional[RecommendationStore]): The store of computed recommendations
+            which makes evaluation resumable. It is opened from store_path of evaluation or eval_store_path of config.
     """
     def __init__(
         self, config: tp.Dict[str, tp.Any], model: AbstractRecommender):
         super().__init__(config, model)
+        self.recommendation_store = None
+        self._dump_batches = None
+
+    def _user_inputs(
+        self, eval_data: AbstractDataLoader, interaction: tp.Any, inter_idx: int
+    ) -> tp.Tuple[str, tp.List[str]]:
+        user_id = interaction[inter_idx]["user_id"]
+        history_ids = interaction[inter_idx]["item_id_list"]
+        history_length = min(
+            self.config["MAX_ITEM_LIST_LENGTH"],
+            interaction[inter_idx]["item_length"],
+        )
+        #history_names = eval_data.dataset.item_id2text(history_ids[:history_length])
+        history_item_ids = eval_data.dataset.id2token("item_id", history_ids[:history_length])
+        #prev_interactions = dict(zip(history_item_ids, history_names))
+        prev_interactions=history_item_ids
+
+        user_token_id = eval_data.dataset.id2token("user_id", user_id)
+        return user_token_id, prev_interactions
+
+    @torch.no_grad()
+    def _recommend_user(self, user_token_id: str, prev_interactions: tp.List[str]) -> tp.List[str]:
+        # no_grad is set here too, because grad mode is thread-local and workers do not inherit it
+        return self.model.recommend(
+            user_token_id=user_token_id,
+            user_profile=user_token_id,
+            prev_interactions=prev_interactions,
+            top_k=max(self.config['topk'])
+        )
+
+    def _recommend_or_load(self, user_token_id: str, prev_interactions: tp.List[str]) -> tp.List[str]:
+        if self.recommendation_store is None:
+            return self._recommend_user(user_token_id, prev_interactions)
+        key = RecommendationStore.make_key(user_token_id, prev_interactions)
+        candidates = self.recommendation_store.get(key)
+        if candidates is None:
+            candidates = self._recommend_user(user_token_id, prev_interactions)
+            self.recommendation_store.add(key, candidates, user=str(user_token_id))
+        return candidates
+
+    def _open_store(self, store_path: str = None) -> None:
+        store_path = store_path or self.config["eval_store_path"]
+        if store_path:
+            # AgentTrainer evaluates a model without tasks, it is described itself
+            tasks = getattr(self.model, "tasks", [self.model])
+            fingerprint = pipeline_fingerprint(tasks, max(self.config["topk"]))
+            self.recommendation_store = RecommendationStore(store_path, fingerprint=fingerprint)
+
+    def _sparse_topk_supported(self) -> bool:
+        # metrics which need only top-k hits are computed without dense scores over all items
+        register = self.eval_collector.register
+        return register.need("rec.topk") and not any(
+            register.need(key) for key in ["rec.items", "rec.meanrank", "rec.score", "data.label"]
+        )
+
+    def _collect_batch(
+        self,
+        batch_candidates: tp.List[tp.List[str]],
+        eval_data: AbstractDataLoader,
+        interaction: tp.Any,
+        positive_u: torch.Tensor,
+        positive_i: torch.Tensor,
+    ) -> None:
+        candidate_matrix = candidates_to_matrix(
+            [eval_data.dataset.token2id("item_id", candidates) for candidates in batch_candidates],
+            min_width=max(self.config["topk"]),
+        )
+        if self._dump_batches is not None:
+            self._dump_batches.append((candidate_matrix, positive_u, positive_i))
+        if self._sparse_topk_supported():
+            self.eval_collector.data_struct.update_tensor(
+                "rec.topk",
+                topk_from_candidates(
+                    candidate_matrix, positive_u, positive_i, max(self.config["topk"]), self.tot_item_num
+                ),
+            )
+            return
+
+        # scores for metrics
+        scores = candidates_to_scores(candidate_matrix, self.tot_item_num)
+        scores[:, 0] = -np.inf
+        self.eval_collector.eval_batch_collect(
+            scores, interaction, positive_u, positive_i
+        )
 
     @torch.no_grad()
     def evaluate(
-        self, eval_data: AbstractDataLoader, show_progress: bool = False
+        self,
+        eval_data: AbstractDataLoader,
+        show_progress: bool = False,
+        store_path: str = None,
+        dump_path: str = None,
     ) -> tp.OrderedDict[str, float]:
         """
         Run evaluation of pipeline on test dataset.
@@ -26,6 +124,18 @@ class PipelineTrainer(Trainer):
         Args:
             eval_data (AbstractDataLoader): DataLoader from RecBole with test data.
             show_progress (bool): Add tqdm logging to dataset iteration process
+            store_path (str, optional): The path to recommendation store. Defaults to eval_store_path of config.
+            dump_path (str, optional): The path to NPZ dump of recommendations. Defaults to eval_dump_path of config.
+
+        Users of a batch are processed concurrently by eval_num_workers threads from config,
+        the results are collected in the order of users in the batch.
+        If store path is set, recommendations are appended to the store as they are computed
+        and users already present in the store are not recomputed, so interrupted runs could be resumed.
+        The store is resumed only by the pipeline with the same fingerprint and top-k.
+        If the metrics need only top-k hits (e.g. Recall, NDCG), they are collected from candidate lists
+        directly, otherwise dense scores are built with one vectorized scatter per batch.
+        If dump path is set, ranked candidates and positive items of all users are saved
+        to NPZ file, so metrics could be recomputed later by evaluate_recommendations without running models.
         """
         self.model.eval()
         if self.config["eval_type"] == EvaluatorType.RANKING:
@@ -41,48 +151,39 @@ class PipelineTrainer(Trainer):
             else eval_data
         )
 
+        num_workers = self.config["eval_num_workers"] or 1
+        self._open_store(store_path)
+        executor = ThreadPoolExecutor(max_workers=num_workers) if num_workers > 1 else None
+        dump_path = dump_path or self.config["eval_dump_path"]
+        self._dump_batches = [] if dump_path else None
+
         num_sample = 0
-        for batched_data in iter_data:
-            num_sample += len(batched_data)
-            interaction, history_index, positive_u, positive_i = batched_data
-            batch_size = len(interaction["user_id"])
-
-            scores = torch.full((batch_size, self.model.n_items), -10000.0)
-
-            for inter_idx in range(batch_size):
-                user_id = interaction[inter_idx]["user_id"]
-                history_ids = interaction[inter_idx]["item_id_list"]
-                history_length = min(
-                    self.config["MAX_ITEM_LIST_LENGTH"],
-                    interaction[inter_idx]["item_length"],
-                )
-                #history_names = eval_data.dataset.item_id2text(history_ids[:history_length])
-                history_item_ids = eval_data.dataset.id2token("item_id", history_ids[:history_length])
-                #prev_interactions = dict(zip(history_item_ids, history_names))
-                prev_interactions=history_item_ids
-                
-                user_token_id = eval_data.dataset.id2token("user_id", user_id)
-
-                # model part
-                candidates = self.model.recommend(
-                    user_token_id=user_token_id,
-                    user_profile=user_token_id,
-                    prev_interactions=prev_interactions,
-                    top_k=max(self.config['topk'])
-                )
-                candidate_ids = eval_data.dataset.token2id("item_id", candidates)
+        try:
+            for batched_data in iter_data:
+                num_sample += len(batched_data)
+                interaction, history_index, positive_u, positive_i = batched_data
+                batch_size = len(interaction["user_id"])
 
-                # scores for metrics
-                for i, id in enumerate(candidate_ids):
-                    scores[inter_idx, id] = max(
-                        len(candidate_ids) - i, scores[inter_idx, id]
-                    )
+                user_inputs = [
+                    self._user_inputs(eval_data, interaction, inter_idx) for inter_idx in range(batch_size)
+                ]
+                # model part, map keeps the order of users
+                if executor is not None:
+                    batch_candidates = list(executor.map(lambda inputs: self._recommend_or_load(*inputs), user_inputs))
+                else:
+                    batch_candidates = [self._recommend_or_load(*inputs) for inputs in user_inputs]
 
-            scores = scores.view(-1, self.tot_item_num)
-            scores[:, 0] = -np.inf
-            self.eval_collector.eval_batch_collect(
-                scores, interaction, positive_u, positive_i
-            )
+                self._collect_batch(batch_candidates, eval_data, interaction, positive_u, positive_i)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if self.recommendation_store is not None:
+                self.recommendation_store.close()
+                self.recommendation_store = None
+
+        if self._dump_batches is not None:
+            save_recommendations(dump_path, self._dump_batches, self.tot_item_num)
+            self._dump_batches = None
 
         self.eval_collector.model_collect(self.model)
         struct = self.eval_collector.get_data_struct()
@@ -90,4 +191,132 @@ class PipelineTrainer(Trainer):
         if not self.config["single_spec"]:
             result = self._map_reduce(result, num_sample)
         self.wandblogger.log_eval_metrics(result, head="eval")
-        return result
\ No newline at end of file
+        return result
+
+    @torch.no_grad()
+    def evaluate_sampled(
+        self,
+        eval_data: AbstractDataLoader,
+        max_ci_width: float = 0.02,
+        confidence: float = 0.95,
+        target_metric: str = None,
+        min_users: int = 100,
+        max_users: int = None,
+        user_activity: tp.Dict[int, int] = None,
+        n_strata: int = 4,
+        n_bootstrap: int = 1000,
+        seed: int = 2024,
+        show_progress: bool = False,
+        store_path: str = None,
+    ) -> tp.OrderedDict[str, float]:
+        """
+        Run evaluation on users sampled with stratification by history length and activity.
+        Users are evaluated in the order where every prefix is a stratified sample, and the evaluation stops
+        once the bootstrap confidence interval of target metric is narrower than max_ci_width.
+
+        Args:
+            eval_data (AbstractDataLoader): DataLoader from RecBole with test data.
+            max_ci_width (float): The width of confidence interval of target metric to stop at.
+            confidence (float): The confidence level of intervals.
+            target_metric (str, optional): The metric controlling early stopping. Defaults to valid_metric of config.
+            min_users (int): The number of users evaluated before the first check of the interval.
+            max_users (int, optional): The maximum number of evaluated users. Defaults to None (all users).
+            user_activity (Dict[int, int], optional): The number of interactions of users by internal id,
+                e.g. dataset.counter('user_id'). Defaults to None (users are stratified by history length only).
+            n_strata (int): The number of quantile bins of history length and activity.
+            n_bootstrap (int): The number of bootstrap resamples.
+            seed (int): The seed of sampling and bootstrap.
+            show_progress (bool): Add tqdm logging to evaluation process
+            store_path (str, optional): The path to recommendation store. Defaults to eval_store_path of config.
+
+        Returns:
+            OrderedDict[str, float]: The estimates of metrics with the bounds of their confidence intervals
+                ('<metric>_ci_low', '<metric>_ci_high'), the number of evaluated users and whether
+                the evaluation stopped early.
+        """
+        self.model.eval()
+        self.tot_item_num = eval_data._dataset.item_num
+        if not self._sparse_topk_supported():
+            raise ValueError("Sampled evaluation supports only metrics computed from top-k hits, e.g. Recall, NDCG")
+        target_metric = (target_metric or self.config["valid_metric"]).lower()
+        max_k = max(self.config["topk"])
+
+        # inputs of all users are collected without calling the model
+        user_inputs, positives, history_lengths, activity = [], [], [], []
+        for interaction, history_index, positive_u, positive_i in eval_data:
+            for inter_idx in range(len(interaction["user_id"])):
+                user_inputs.append(self._user_inputs(eval_data, interaction, inter_idx))
+                positives.append(positive_i[positive_u == inter_idx].long().cpu())
+                history_lengths.append(len(user_inputs[-1][1]))
+                user_id = int(interaction[inter_idx]["user_id"])
+                activity.append(user_activity[user_id] if user_activity is not None else history_lengths[-1])
+
+        order, strata = stratified_order(np.array(history_lengths), np.array(activity), n_strata, seed)
+        strata_weights = {stratum: share for stratum, share in enumerate(np.bincount(strata) / len(strata))}
+        if max_users is not None:
+            order = order[:max_users]
+
+        num_workers = self.config["eval_num_workers"] or 1
+        self._open_store(store_path)
+        executor = ThreadPoolExecutor(max_workers=num_workers) if num_workers > 1 else None
+
+        chunk_size = self.config["eval_batch_size"] or 1
+        chunk_starts = range(0, len(order), chunk_size)
+        iter_chunks = (
+            tqdm(chunk_starts, ncols=100, desc=set_color(f"Evaluate sampled ", "pink"))
+            if show_progress
+            else chunk_starts
+        )
+        topk_rows = []
+        num_evaluated = 0
+        stopped_early = False
+        try:
+            for start in iter_chunks:
+                chunk = order[start : start + chunk_size]
+                chunk_inputs = [user_inputs[user_idx] for user_idx in chunk]
+                if executor is not None:
+                    chunk_candidates = list(executor.map(lambda inputs: self._recommend_or_load(*inputs), chunk_inputs))
+                else:
+                    chunk_candidates = [self._recommend_or_load(*inputs) for inputs in chunk_inputs]
+
+                candidate_matrix = candidates_to_matrix(
+                    [eval_data.dataset.token2id("item_id", candidates) for candidates in chunk_candidates],
+                    min_width=max_k,
+                )
+                chunk_positive_u = torch.cat(
+                    [torch.full((len(positives[user_idx]),), row, dtype=torch.long) for row, user_idx in enumerate(chunk)]
+                )
+                chunk_positive_i = torch.cat([positives[user_idx] for user_idx in chunk])
+                topk_rows.append(
+                    topk_from_candidates(candidate_matrix, chunk_positive_u, chunk_positive_i, max_k, self.tot_item_num)
+                )
+                num_evaluated += len(chunk)
+
+                if min_users <= num_evaluated < len(order):
+                    values = per_user_metrics(self.config, torch.cat(topk_rows))[target_metric]
+                    _, low, high = stratified_bootstrap(
+                        values, strata[order[:num_evaluated]], strata_weights, n_bootstrap, confidence, seed
+                    )
+                    if high - low <= max_ci_width:
+                        stopped_early = True
+                        break
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if self.recommendation_store is not None:
+                self.recommendation_store.close()
+                self.recommendation_store = None
+
+        result = OrderedDict()
+        metric_values = per_user_metrics(self.config, torch.cat(topk_rows)) if topk_rows else {}
+        decimal_place = self.config["metric_decimal_place"] or 4
+        for metric_name, values in metric_values.items():
+            estimate, low, high = stratified_bootstrap(
+                values, strata[order[:num_evaluated]], strata_weights, n_bootstrap, confidence, seed
+            )
+            result[metric_name] = round(estimate, decimal_place)
+            result[f"{metric_name}_ci_low"] = round(low, decimal_place)
+            result[f"{metric_name}_ci_high"] = round(high, decimal_place)
+        result["num_users"] = num_evaluated
+        result["stopped_early"] = stopped_early
+        return result
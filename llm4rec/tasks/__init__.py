@@ -4,6 +4,8 @@ from llm4rec.tasks.information_retrieval.general_retriever import (
 from llm4rec.tasks.augmentation.item_augmentation import ItemAugmentation
 from llm4rec.tasks.augmentation.user_augmentation import UserAugmentation
 from llm4rec.tasks.ranking.general_ranker import RankerRecommender
+from llm4rec.tasks.ranking.likelihood_ranker import LikelihoodRanker
+from llm4rec.tasks.ranking.cascade_ranker import CascadeRanker
 from llm4rec.tasks.recbole_models.model_wrappers import GeneralRecBoleModelWrapper, SequentialRecBoleModelWrapper
 from llm4rec.tasks.explanation.explanation import ExplainableRecommender
 
@@ -12,6 +14,8 @@ __all__ = [
     "UserAugmentation",
     "RetrievalRecommender",
     "RankerRecommender",
+    "LikelihoodRanker",
+    "CascadeRanker",
     "ExplainableRecommender",
     "GeneralRecBoleModelWrapper",
     "SequentialRecBoleModelWrapper"
@@ -0,0 +1,110 @@
+import typing as tp
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring. Term weights in documents are precomputed
+    into sparse matrix with postings as rows, so scoring of queries is one sparse matrix product
+    touching only the postings of query terms.
+
+    Attributes:
+        vectorizer (CountVectorizer): The tokenizer and vocabulary of the index.
+        term_doc_weights (sp.csr_matrix): BM25 weights of terms in documents of shape (vocab_size, n_docs).
+        item_ids (List[Any]): Ordered unique item ids of the index.
+        doc_items (np.ndarray): The position in item_ids of the item each document belongs to.
+    """
+
+    def __init__(
+        self,
+        texts: tp.List[str],
+        item_ids: tp.List[tp.Any],
+        k1: float = 1.5,
+        b: float = 0.75,
+        vectorizer_kwargs: tp.Dict[str, tp.Any] = None,
+    ) -> None:
+        """
+        Initializes BM25Index.
+
+        Args:
+            texts (List[str]): Texts of documents.
+            item_ids (List[Any]): Item id of each document, several documents could belong to one item.
+            k1 (float): Term frequency saturation parameter.
+            b (float): Document length normalization parameter.
+            vectorizer_kwargs (Dict[str, Any], optional): Additional arguments for CountVectorizer.
+        """
+        self.vectorizer = CountVectorizer(**(vectorizer_kwargs or {}))
+        term_freqs = self.vectorizer.fit_transform(texts).tocsr().astype(np.float32)
+
+        num_docs = term_freqs.shape[0]
+        doc_freqs = np.bincount(term_freqs.indices, minlength=term_freqs.shape[1])
+        idf = np.log(1.0 + (num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+
+        doc_lens = np.asarray(term_freqs.sum(axis=1)).ravel()
+        length_norm = k1 * (1.0 - b + b * doc_lens / max(doc_lens.mean(), 1e-9))
+        # repeat per-document normalization for every stored term of the document
+        row_norm = np.repeat(length_norm, np.diff(term_freqs.indptr)).astype(np.float32)
+
+        tf = term_freqs.data
+        weights = term_freqs.copy()
+        weights.data = idf[term_freqs.indices] * tf * (k1 + 1.0) / (tf + row_norm)
+        self.term_doc_weights = weights.T.tocsr()
+
+        self.item_ids = list(dict.fromkeys(item_ids))
+        self._item_positions = {item_id: idx for idx, item_id in enumerate(self.item_ids)}
+        self.doc_items = np.array([self._item_positions[item_id] for item_id in item_ids], dtype=np.int64)
+
+    def _doc_scores(self, queries: tp.List[str]) -> sp.csr_matrix:
+        query_terms = self.vectorizer.transform(queries).tocsr()
+        query_terms.data = np.ones_like(query_terms.data, dtype=np.float32)
+        # only documents sharing a term with the query are stored in the result
+        return (query_terms @ self.term_doc_weights).tocsr()
+
+    def search_batch(
+        self, queries: tp.List[str], k: int, exclude_items: tp.List[tp.List[tp.Any]] = None
+    ) -> tp.List[tp.Tuple[tp.List[tp.Any], tp.List[float]]]:
+        """
+        Find k items with the highest BM25 score for each query. Items without any common term
+        with the query are not returned.
+
+        Args:
+            queries (List[str]): Query texts.
+            k (int): The number of items to return for each query.
+            exclude_items (List[List[Any]], optional): Items that should not be returned for each query.
+
+        Returns:
+            List[Tuple[List[Any], List[float]]]: Item ids and their scores for each query ordered by score.
+        """
+        doc_scores = self._doc_scores(queries)
+        results = []
+        for query_idx in range(len(queries)):
+            row = slice(doc_scores.indptr[query_idx], doc_scores.indptr[query_idx + 1])
+            positions = self.doc_items[doc_scores.indices[row]]
+            scores = doc_scores.data[row]
+
+            if len(positions) > 0 and len(self.item_ids) < len(self.doc_items):
+                # the score of item is the best score of its documents
+                order = np.lexsort((-scores, positions))
+                positions, scores = positions[order], scores[order]
+                first = np.concatenate(([True], positions[1:] != positions[:-1]))
+                positions, scores = positions[first], scores[first]
+
+            if exclude_items is not None and len(exclude_items[query_idx]) > 0:
+                excluded = [self._item_positions[item] for item in exclude_items[query_idx] if item in self._item_positions]
+                keep = ~np.isin(positions, excluded)
+                positions, scores = positions[keep], scores[keep]
+
+            if len(positions) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                positions, scores = positions[top], scores[top]
+            order = np.argsort(-scores, kind="stable")
+            results.append(([self.item_ids[pos] for pos in positions[order]], scores[order].tolist()))
+        return results
+
+    def search(
+        self, query: str, k: int, exclude_items: tp.List[tp.Any] = None
+    ) -> tp.Tuple[tp.List[tp.Any], tp.List[float]]:
+        return self.search_batch([query], k, [exclude_items] if exclude_items is not None else None)[0]
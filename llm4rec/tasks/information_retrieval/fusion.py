@@ -0,0 +1,52 @@
+import typing as tp
+
+import numpy as np
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: tp.List[tp.List[tp.Any]], weights: tp.List[float] = None, rrf_k: int = 60
+) -> tp.List[tp.Any]:
+    """
+    Fuse ranked lists of items with reciprocal rank fusion.
+
+    Args:
+        ranked_lists (List[List[Any]]): Lists of item ids ordered by relevance.
+        weights (List[float], optional): The weight of each list. Defaults to equal weights.
+        rrf_k (int): The smoothing constant of reciprocal ranks.
+
+    Returns:
+        List[Any]: Item ids ordered by fused score.
+    """
+    weights = weights if weights is not None else [1.0] * len(ranked_lists)
+    fused_scores = {}
+    for ranked_list, weight in zip(ranked_lists, weights):
+        for rank, item_id in enumerate(ranked_list):
+            fused_scores[item_id] = fused_scores.get(item_id, 0.0) + weight / (rrf_k + rank + 1)
+    return sorted(fused_scores, key=fused_scores.get, reverse=True)
+
+
+def weighted_score_fusion(
+    ranked_lists: tp.List[tp.Tuple[tp.List[tp.Any], tp.List[float]]], weights: tp.List[float] = None
+) -> tp.List[tp.Any]:
+    """
+    Fuse lists of scored items by weighted sum of min-max normalized scores.
+    Items missing from the list get the zero score of this list.
+
+    Args:
+        ranked_lists (List[Tuple[List[Any], List[float]]]): Item ids and their scores (the higher the better).
+        weights (List[float], optional): The weight of each list. Defaults to equal weights.
+
+    Returns:
+        List[Any]: Item ids ordered by fused score.
+    """
+    weights = weights if weights is not None else [1.0] * len(ranked_lists)
+    fused_scores = {}
+    for (item_ids, scores), weight in zip(ranked_lists, weights):
+        if len(item_ids) == 0:
+            continue
+        scores = np.asarray(scores, dtype=np.float32)
+        score_range = scores.max() - scores.min()
+        normalized = (scores - scores.min()) / score_range if score_range > 0 else np.ones_like(scores)
+        for item_id, score in zip(item_ids, normalized.tolist()):
+            fused_scores[item_id] = fused_scores.get(item_id, 0.0) + weight * score
+    return sorted(fused_scores, key=fused_scores.get, reverse=True)
@@ -1,16 +1,38 @@
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.text_splitter import CharacterTextSplitter
 from langchain_community.document_loaders.csv_loader import CSVLoader
 from langchain_huggingface.embeddings import HuggingFaceEmbeddings
 from langchain_core.embeddings import Embeddings
 from langchain_core.documents import Document
+from tqdm import tqdm
+import numpy as np
+import faiss
 import torch
 
 import os
+import csv
+import shutil
+import json
+import time
+import uuid
+import hashlib
+import warnings
 import typing as tp
 
 from llm4rec.tasks.base_recommender import Recommender
 from llm4rec.memory.base_memory import BaseMemory
+from llm4rec.utils.cache import LRUCache
+from llm4rec.tasks.information_retrieval.bm25 import BM25Index
+from llm4rec.tasks.information_retrieval.fusion import reciprocal_rank_fusion, weighted_score_fusion
+from llm4rec.utils.faiss_index_io import (
+    embeddings_fingerprint,
+    file_hash,
+    index_cache_key,
+    load_vectorstore,
+    save_vectorstore,
+    vectorstore_exists,
+)
 
 class RetrievalRecommender(Recommender):
     """
@@ -22,8 +44,17 @@ class RetrievalRecommender(Recommender):
         text_splitter (CharacterTextSplitter): The CharacterTextSplitter instance for splitting documents.
         embeddings_model (Embeddings): The embeddings model instance for generating embeddings.
         retriever (Optional[FAISS]): The FAISS retriever.
+        index_cache_path (Optional[str]): The directory of the cached index used by this instance.
+        index_type (str): The type of FAISS index.
+        query_mode (str): The way the query vector of user is built.
+        query_cache (Optional[LRUCache]): The cache of query vectors.
+        bm25 (Optional[BM25Index]): The lexical index over the same item texts used in hybrid search.
     """
 
+    index_types = ["flat", "ivf_flat", "hnsw", "ivf_pq"]
+    query_modes = ["text", "mean", "recency", "attention"]
+    fusion_types = ["rrf", "weighted"]
+
     base_query = """
         The user {user_profile} have interacted with this content: {user_history}. What content is similar to it?
     """
@@ -44,6 +75,29 @@ class RetrievalRecommender(Recommender):
         emb_model_name: str = "all-MiniLM-L6-v2",
         emb_model_kwargs: tp.Dict[str, tp.Any] = {"device":"cuda:0" if torch.cuda.is_available() else "cpu"},
         query=None,
+        index_cache_dir: str = None,
+        mmap_index: bool = True,
+        index_type: str = "flat",
+        index_kwargs: tp.Dict[str, tp.Any] = None,
+        nprobe: int = None,
+        ef_search: int = None,
+        query_mode: str = "text",
+        recency_decay: float = 0.8,
+        attention_temperature: float = 1.0,
+        streaming_build: bool = False,
+        build_chunk_size: int = 10000,
+        embed_batch_size: int = 256,
+        build_checkpoint_dir: str = None,
+        query_cache_size_mb: float = None,
+        query_cache_ttl: float = None,
+        hybrid_search: bool = False,
+        fusion: str = "rrf",
+        lexical_weight: float = 0.5,
+        rrf_k: int = 60,
+        fusion_candidates: int = 100,
+        bm25_kwargs: tp.Dict[str, tp.Any] = None,
+        items2text: tp.Callable = None,
+        build_checkpoint_interval: float = 300.0,
     ):
         """
         Initializes the Retriever.
@@ -57,33 +111,576 @@ class RetrievalRecommender(Recommender):
             emb_model_name: (str, optional): The name of the embedding model if no embeddings are passed
             emb_model_kwargs (Dict[str, Any], optional): Additional arguments for Embeddings instance. Defaults to {"device": "cuda:0"}.
             query (str, optional): Custom query for the retrieval. Defaults to None.
+            index_cache_dir (str, optional): The directory for on-disk cache of built indexes. The cache entry is
+                keyed on the hash of items data, the fingerprint of embeddings (file hash or model name with
+                encoder settings) and the loader and splitter arguments, so the restart with unchanged catalogue
+                skips embedding. Embeddings without known identity are not cached. Defaults to None (no caching).
+            mmap_index (bool, optional): Whether to memory-map the cached index on load. Only IVF inverted lists
+                and, with recent FAISS versions, flat codes are mapped, the HNSW graph is always read to RAM.
+                Defaults to True.
+            index_type (str, optional): The type of FAISS index. Available options: ['flat', 'ivf_flat', 'hnsw', 'ivf_pq'].
+                'flat' is the exact search, other types are approximate. Defaults to 'flat'.
+            index_kwargs (Dict[str, Any], optional): Additional arguments for building approximate index:
+                'nlist' (number of IVF clusters), 'pq_m' and 'pq_nbits' (IVF-PQ code size), 'hnsw_m' and
+                'ef_construction' (HNSW graph), 'train_size' (number of vectors sampled for training). Defaults to None.
+            nprobe (int, optional): The number of IVF clusters visited at query time. Defaults to None (FAISS default).
+            ef_search (int, optional): The size of HNSW candidate list at query time. Defaults to None (FAISS default).
+            query_mode (str, optional): The way the query vector is built. Available options: ['text', 'mean', 'recency', 'attention'].
+                'text' embeds the text query with user history, other modes pool the stored vectors of history items
+                without calling embeddings model at request time. Defaults to 'text'.
+            recency_decay (float, optional): The weight decay per step back in history for 'recency' mode. Defaults to 0.8.
+            attention_temperature (float, optional): The softmax temperature of 'attention' mode, where history items
+                are weighted by similarity to the last item. Defaults to 1.0.
+            streaming_build (bool, optional): Whether to build the index from items file chunk by chunk instead of
+                loading the whole catalogue to memory. Only for loading from file. Defaults to False.
+            build_chunk_size (int, optional): The number of file rows read per chunk in streaming build. Defaults to 10000.
+            embed_batch_size (int, optional): The number of documents embedded at once in streaming build. Defaults to 256.
+            build_checkpoint_dir (str, optional): The directory where streaming build periodically saves the index,
+                so the interrupted build is resumed from the last saved chunk. The checkpoint is resumed only if it was
+                built from the same items file, embeddings and index arguments. Defaults to None.
+            query_cache_size_mb (float, optional): The size limit of LRU cache of query vectors in megabytes.
+                Text queries are cached by normalized query text, pooled queries by the tuple of history item ids.
+                Defaults to None (no caching).
+            query_cache_ttl (float, optional): The time in seconds after which cached query vectors expire. Defaults to None.
+            hybrid_search (bool, optional): Whether to fuse dense results with results of BM25 index built over the same
+                item texts. The lexical query is the text of history items. Defaults to False.
+            fusion (str, optional): The fusion of dense and lexical results. Available options: ['rrf', 'weighted'].
+                'rrf' is reciprocal rank fusion, 'weighted' is weighted sum of min-max normalized scores. Defaults to 'rrf'.
+            lexical_weight (float, optional): The weight of lexical results in fusion, dense results get 1 - lexical_weight.
+                Defaults to 0.5.
+            rrf_k (int, optional): The smoothing constant of reciprocal rank fusion. Defaults to 60.
+            fusion_candidates (int, optional): The number of candidates taken from each retriever before fusion. Defaults to 100.
+            bm25_kwargs (Dict[str, Any], optional): Additional arguments for BM25Index (k1, b, vectorizer_kwargs). Defaults to None.
+            items2text (Callable, optional): The bulk version of item2text returning texts of list of items,
+                e.g. RecboleSeqDataset.item_tokens2text. Defaults to None (item2text is called for each item).
+            build_checkpoint_interval (float, optional): The minimum time in seconds between checkpoints
+                of streaming build. Defaults to 300.
 
         """
+        if index_type not in self.index_types:
+            raise ValueError(
+                f"The type of index should be one of: {self.index_types}. Got: {index_type}"
+            )
+        if query_mode not in self.query_modes:
+            raise ValueError(
+                f"The query mode should be one of: {self.query_modes}. Got: {query_mode}"
+            )
+        if query_mode != "text" and search_type != "similarity":
+            raise ValueError(
+                f"Query mode '{query_mode}' is supported only with 'similarity' search type. Got: {search_type}"
+            )
+        if fusion not in self.fusion_types:
+            raise ValueError(
+                f"The fusion type should be one of: {self.fusion_types}. Got: {fusion}"
+            )
+        if hybrid_search and search_type != "similarity":
+            raise ValueError(
+                f"Hybrid search is supported only with 'similarity' search type. Got: {search_type}"
+            )
         self.item2text = item2text
+        self.items2text = items2text
         self.item_memory = item_memory
+        self.query_mode = query_mode
+        self.recency_decay = recency_decay
+        self.attention_temperature = attention_temperature
+        self.index_type = index_type
+        self.index_kwargs = index_kwargs.copy() if index_kwargs else {}
         self.text_splitter = CharacterTextSplitter(**text_splitter_args)
 
         if load_from_file:
             if not os.path.isfile(items_info_path):
                 raise FileNotFoundError("CSV file not found.")
-            docs = self._load_from_file(items_info_path, csv_loader_args)
         else:
             if type(self.item_memory) == type(None):
                 raise ValueError("Item memory instance should be provided.")
-            
-            docs = self._load_from_memory()
-            
+
         if not embeddings:
             embeddings = HuggingFaceEmbeddings(
                 model_name=emb_model_name, model_kwargs=emb_model_kwargs
             )
         self.embeddings = embeddings
-        vectorstore = FAISS.from_documents(docs, self.embeddings)
 
+        # the key identifies the content of index for the cache and for checkpoints of streaming build
+        cache_key = None
+        if index_cache_dir or (load_from_file and streaming_build and build_checkpoint_dir):
+            emb_fingerprint = embeddings_fingerprint(self.embeddings)
+            if emb_fingerprint is None:
+                warnings.warn(
+                    f"The identity of embeddings {type(self.embeddings).__name__} could not be determined, "
+                    "the index is not cached and the build is not checkpointed."
+                )
+            else:
+                cache_key = index_cache_key(
+                    items_hash=file_hash(items_info_path) if load_from_file else self._memory_hash(),
+                    embeddings=emb_fingerprint,
+                    csv_loader_args=csv_loader_args if load_from_file else None,
+                    text_splitter_args=text_splitter_args,
+                    index_type=index_type,
+                    index_kwargs=self.index_kwargs,
+                    index_layout="id_map",
+                )
+        self.index_cache_path = os.path.join(index_cache_dir, cache_key) if index_cache_dir and cache_key else None
+
+        self._index_mmapped = False
+        if self.index_cache_path and vectorstore_exists(self.index_cache_path):
+            vectorstore, self._index_mmapped = load_vectorstore(self.index_cache_path, self.embeddings, mmap=mmap_index)
+        else:
+            if load_from_file and streaming_build:
+                vectorstore = self._build_vectorstore_streaming(
+                    items_info_path,
+                    csv_loader_args,
+                    build_chunk_size,
+                    embed_batch_size,
+                    build_checkpoint_dir if cache_key else None,
+                    build_checkpoint_interval,
+                    cache_key,
+                )
+            else:
+                if load_from_file:
+                    docs = self._load_from_file(items_info_path, csv_loader_args)
+                else:
+                    docs = self._load_from_memory()
+                vectorstore = self._build_vectorstore(docs)
+            if self.index_cache_path:
+                save_vectorstore(vectorstore, self.index_cache_path)
+
+        self.vectorstore = vectorstore
+        self.nprobe = None
+        self.ef_search = None
+        self.set_search_params(nprobe=nprobe, ef_search=ef_search)
+        self.search_type = search_type
+        self.search_kwargs = search_kwargs.copy()
+        # the retriever is kept for langchain interoperability, recommendations never mutate its search_kwargs
         self.retriever = vectorstore.as_retriever(
             search_type=search_type, search_kwargs=search_kwargs.copy()
         )
         self.query = query if query else self.base_query
+        self.query_cache = (
+            LRUCache(max_size_mb=query_cache_size_mb, ttl=query_cache_ttl)
+            if query_cache_size_mb is not None
+            else None
+        )
+        self._item_labels = self._build_item_labels()
+        self._next_label = max(self.vectorstore.index_to_docstore_id.keys(), default=-1) + 1
+
+        self.fusion = fusion
+        self.lexical_weight = lexical_weight
+        self.rrf_k = rrf_k
+        self.fusion_candidates = fusion_candidates
+        self.bm25_kwargs = bm25_kwargs.copy() if bm25_kwargs else {}
+        self.bm25 = self._build_bm25() if hybrid_search else None
+
+    def _build_bm25(self) -> BM25Index:
+        docs = [
+            self.vectorstore.docstore.search(doc_id)
+            for doc_id in self.vectorstore.index_to_docstore_id.values()
+        ]
+        return BM25Index(
+            [doc.page_content for doc in docs], [doc.metadata["source"] for doc in docs], **self.bm25_kwargs
+        )
+
+    def _embed_documents(self, docs: tp.List[Document]) -> np.ndarray:
+        return np.asarray(
+            self.embeddings.embed_documents([doc.page_content for doc in docs]), dtype=np.float32
+        )
+
+    def _build_vectorstore(self, docs: tp.List[Document]) -> FAISS:
+        vectors = self._embed_documents(docs)
+        index = self._create_index(vectors.shape[1], len(vectors))
+        if not index.is_trained:
+            train_size = min(self.index_kwargs.get("train_size", 50000), len(vectors))
+            train_idx = np.random.default_rng(0).choice(len(vectors), size=train_size, replace=False)
+            index.train(vectors[train_idx])
+
+        vectorstore = FAISS(self.embeddings, index, InMemoryDocstore({}), {})
+        self._add_to_vectorstore(vectorstore, docs, vectors, np.arange(len(docs), dtype=np.int64))
+        return vectorstore
+
+    def _build_vectorstore_streaming(
+        self,
+        items_info_path: str,
+        csv_loader_args: tp.Dict[tp.Any, tp.Any],
+        chunk_size: int,
+        batch_size: int,
+        checkpoint_dir: str = None,
+        checkpoint_interval: float = 300.0,
+        index_key: str = None,
+    ) -> FAISS:
+        """
+        Build the index by reading items file in chunks and appending embedded batches to the index,
+        so only one batch of vectors is kept in memory. Indexes that need training are trained beforehand
+        on the reservoir sample of documents taken by a separate pass over the file, which only reads texts.
+        """
+        with open(items_info_path, "rb") as f:
+            num_rows = max(sum(1 for _ in f) - 1, 1)
+
+        vectorstore = None
+        rows_done = 0
+        state_dir = self._checkpoint_state_dir(checkpoint_dir) if checkpoint_dir else None
+        if state_dir is not None:
+            with open(os.path.join(state_dir, "progress.json")) as f:
+                checkpoint_state = json.load(f)
+            if checkpoint_state.get("index_key") != index_key:
+                raise ValueError(
+                    f"The checkpoint in {checkpoint_dir} was built from other items file, embeddings or index arguments. "
+                    "Remove it or use another checkpoint directory."
+                )
+            vectorstore, _ = load_vectorstore(state_dir, self.embeddings, mmap=False)
+            rows_done = checkpoint_state["rows_done"]
+        next_label = max(vectorstore.index_to_docstore_id.keys(), default=-1) + 1 if vectorstore else 0
+
+        if vectorstore is None and self.index_type in ["ivf_flat", "ivf_pq"]:
+            train_size = min(self.index_kwargs.get("train_size", 50000), num_rows)
+            train_docs = self._sample_file_documents(items_info_path, csv_loader_args, chunk_size, train_size)
+            if len(train_docs) == 0:
+                raise ValueError("Items file does not contain any items.")
+            train_vectors = np.concatenate(
+                [self._embed_documents(train_docs[start:start + batch_size]) for start in range(0, len(train_docs), batch_size)]
+            )
+            vectorstore = FAISS(
+                self.embeddings, self._create_index(train_vectors.shape[1], num_rows), InMemoryDocstore({}), {}
+            )
+            vectorstore.index.train(train_vectors)
+            del train_vectors
+
+        last_checkpoint_time = time.monotonic()
+        progress = tqdm(total=num_rows, initial=rows_done, desc="Building index")
+        for chunk_docs, chunk_rows in self._iter_file_chunks(items_info_path, csv_loader_args, chunk_size, rows_done):
+            chunk_docs = self.text_splitter.split_documents(chunk_docs)
+            for start in range(0, len(chunk_docs), batch_size):
+                batch_docs = chunk_docs[start:start + batch_size]
+                batch_vectors = self._embed_documents(batch_docs)
+                if vectorstore is None:
+                    index = self._create_index(batch_vectors.shape[1], num_rows)
+                    vectorstore = FAISS(self.embeddings, index, InMemoryDocstore({}), {})
+
+                labels = np.arange(next_label, next_label + len(batch_docs), dtype=np.int64)
+                self._add_to_vectorstore(vectorstore, batch_docs, batch_vectors, labels)
+                next_label += len(batch_docs)
+
+            progress.update(chunk_rows)
+            rows_done += chunk_rows
+            # the whole index is rewritten on save, so checkpoints are taken by time instead of every chunk
+            if checkpoint_dir and time.monotonic() - last_checkpoint_time >= checkpoint_interval:
+                self._save_build_checkpoint(vectorstore, checkpoint_dir, rows_done, index_key)
+                last_checkpoint_time = time.monotonic()
+        progress.close()
+
+        if vectorstore is None:
+            raise ValueError("Items file does not contain any items.")
+        if checkpoint_dir:
+            self._save_build_checkpoint(vectorstore, checkpoint_dir, rows_done, index_key)
+        return vectorstore
+
+    @staticmethod
+    def _checkpoint_state_dir(checkpoint_dir: str) -> tp.Optional[str]:
+        pointer_path = os.path.join(checkpoint_dir, "CURRENT")
+        if not os.path.isfile(pointer_path):
+            return None
+        with open(pointer_path) as f:
+            state_dir = os.path.join(checkpoint_dir, f.read().strip())
+        if not (vectorstore_exists(state_dir) and os.path.isfile(os.path.join(state_dir, "progress.json"))):
+            return None
+        return state_dir
+
+    @staticmethod
+    def _save_build_checkpoint(vectorstore: FAISS, checkpoint_dir: str, rows_done: int, index_key: str) -> None:
+        """
+        Save the index with the progress to a new state directory and switch CURRENT pointer to it
+        with one os.replace, so the index and the number of processed rows are always consistent.
+        """
+        state_name = f"state-{uuid.uuid4().hex}"
+        state_dir = os.path.join(checkpoint_dir, state_name)
+        save_vectorstore(vectorstore, state_dir)
+        with open(os.path.join(state_dir, "progress.json"), "w") as f:
+            json.dump({"rows_done": rows_done, "index_key": index_key}, f)
+
+        pointer_path = os.path.join(checkpoint_dir, "CURRENT")
+        with open(pointer_path + ".tmp", "w") as f:
+            f.write(state_name)
+        os.replace(pointer_path + ".tmp", pointer_path)
+        # previous states and states left by interrupted saves
+        for name in os.listdir(checkpoint_dir):
+            if name.startswith("state-") and name != state_name:
+                shutil.rmtree(os.path.join(checkpoint_dir, name), ignore_errors=True)
+
+    def _sample_file_documents(
+        self, items_info_path: str, csv_loader_args: tp.Dict[tp.Any, tp.Any], chunk_size: int, sample_size: int
+    ) -> tp.List[Document]:
+        """
+        Reservoir sample of documents of items file, so the training sample is uniform over the whole
+        catalogue even if the file is sorted.
+        """
+        rng = np.random.default_rng(0)
+        sample = []
+        num_seen = 0
+        for chunk_docs, _ in self._iter_file_chunks(items_info_path, csv_loader_args, chunk_size):
+            for doc in self.text_splitter.split_documents(chunk_docs):
+                if len(sample) < sample_size:
+                    sample.append(doc)
+                else:
+                    replace_idx = rng.integers(0, num_seen + 1)
+                    if replace_idx < sample_size:
+                        sample[replace_idx] = doc
+                num_seen += 1
+        return sample
+
+    @staticmethod
+    def _iter_file_chunks(
+        items_info_path: str, csv_loader_args: tp.Dict[tp.Any, tp.Any], chunk_size: int, skip_rows: int = 0
+    ) -> tp.Iterator[tp.Tuple[tp.List[Document], int]]:
+        """
+        Read items file by chunks of rows. Documents are formatted in the same way as by CSVLoader.
+        """
+        source_column = csv_loader_args.get("source_column")
+        metadata_columns = csv_loader_args.get("metadata_columns", [])
+        with open(items_info_path, newline="", encoding=csv_loader_args.get("encoding")) as f:
+            reader = csv.DictReader(f, **(csv_loader_args.get("csv_args") or {}))
+            chunk = []
+            for row_idx, row in enumerate(reader):
+                if row_idx < skip_rows:
+                    continue
+                content = "\n".join(
+                    f"{k.strip()}: {v.strip() if v is not None else v}"
+                    for k, v in row.items()
+                    if k not in metadata_columns
+                )
+                metadata = {"source": row[source_column] if source_column else items_info_path, "row": row_idx}
+                for col in metadata_columns:
+                    metadata[col] = row[col]
+                chunk.append(Document(page_content=content, metadata=metadata))
+                if len(chunk) == chunk_size:
+                    yield chunk, len(chunk)
+                    chunk = []
+            if len(chunk) > 0:
+                yield chunk, len(chunk)
+
+    @staticmethod
+    def _add_to_vectorstore(vectorstore: FAISS, docs: tp.List[Document], vectors: np.ndarray, labels: np.ndarray) -> None:
+        docstore_ids = [str(uuid.uuid4()) for _ in docs]
+        vectorstore.index.add_with_ids(vectors, labels)
+        vectorstore.docstore.add(dict(zip(docstore_ids, docs)))
+        vectorstore.index_to_docstore_id.update(zip(labels.tolist(), docstore_ids))
+
+    def _create_index(self, dim: int, num_vectors: int) -> faiss.Index:
+        """
+        Create empty index, where the labels of vectors are explicit ids, so items could be added
+        and removed without shifting the labels of other items.
+        """
+        if self.index_type == "flat":
+            return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, self.index_kwargs.get("hnsw_m", 32))
+            index.hnsw.efConstruction = self.index_kwargs.get("ef_construction", 40)
+            return faiss.IndexIDMap2(index)
+
+        # IVF needs at least one training point per cluster
+        train_size = min(self.index_kwargs.get("train_size", 50000), num_vectors)
+        nlist = min(self.index_kwargs.get("nlist", int(4 * np.sqrt(num_vectors))), train_size)
+        nlist = max(nlist, 1)
+        if self.index_type == "ivf_flat":
+            factory_string = f"IVF{nlist},Flat"
+        else:
+            pq_m = self.index_kwargs.get("pq_m", 8)
+            if dim % pq_m != 0:
+                raise ValueError(
+                    f"The embedding dimension should be divisible by pq_m. Got: dim={dim}, pq_m={pq_m}"
+                )
+            factory_string = f"IVF{nlist},PQ{pq_m}x{self.index_kwargs.get('pq_nbits', 8)}"
+        index = faiss.index_factory(dim, factory_string)
+        # IVF indexes store ids natively, hashtable direct map allows reconstruction and removal by id
+        faiss.extract_index_ivf(index).set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index
+
+    def _hnsw_index(self) -> faiss.IndexHNSW:
+        return faiss.downcast_index(self.vectorstore.index.index)
+
+    def set_search_params(self, nprobe: int = None, ef_search: int = None) -> None:
+        """
+        Set default recall-vs-latency parameters of approximate index used at query time.
+        The parameters could also be overridden per call of recommend methods.
+
+        Args:
+            nprobe (int, optional): The number of IVF clusters visited at query time.
+            ef_search (int, optional): The size of HNSW candidate list at query time.
+        """
+        self._validate_search_params(nprobe, ef_search)
+        # defaults are written to the index as well, so langchain search paths (mmr, thresholds) use them too
+        if nprobe is not None:
+            self.nprobe = nprobe
+            faiss.extract_index_ivf(self.vectorstore.index).nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+            self._hnsw_index().hnsw.efSearch = ef_search
+
+    def _validate_search_params(self, nprobe: int = None, ef_search: int = None) -> None:
+        if nprobe is not None and self.index_type not in ["ivf_flat", "ivf_pq"]:
+            raise ValueError(f"nprobe is supported only for IVF indexes. Got: {self.index_type}")
+        if ef_search is not None and self.index_type != "hnsw":
+            raise ValueError(f"ef_search is supported only for HNSW index. Got: {self.index_type}")
+
+    def _faiss_search_params(
+        self, nprobe: int = None, ef_search: int = None, selector: faiss.IDSelector = None
+    ) -> tp.Optional[faiss.SearchParameters]:
+        """
+        Build per-call FAISS search parameters, so the shared index is never mutated at query time.
+        """
+        self._validate_search_params(nprobe, ef_search)
+        nprobe = nprobe if nprobe is not None else self.nprobe
+        ef_search = ef_search if ef_search is not None else self.ef_search
+        if selector is None and nprobe is None and ef_search is None:
+            return None
+
+        if self.index_type in ["ivf_flat", "ivf_pq"]:
+            if nprobe is None:
+                nprobe = faiss.extract_index_ivf(self.vectorstore.index).nprobe
+            return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+        if self.index_type == "hnsw":
+            if ef_search is None:
+                ef_search = self._hnsw_index().hnsw.efSearch
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+        return faiss.SearchParameters(sel=selector)
+
+    def _build_item_labels(self) -> tp.Dict[str, tp.List[int]]:
+        """
+        Map item ids to the labels of their vectors in the index (one item could be split into several chunks).
+        """
+        item_labels = {}
+        for label, doc_id in self.vectorstore.index_to_docstore_id.items():
+            item_id = self.vectorstore.docstore.search(doc_id).metadata["source"]
+            item_labels.setdefault(str(item_id), []).append(label)
+        return item_labels
+
+    def _ensure_writable_index(self) -> None:
+        # memory-mapped index is read-only, so it is loaded to RAM before the first modification
+        if self._index_mmapped:
+            self.vectorstore.index = faiss.read_index(os.path.join(self.index_cache_path, "index.faiss"))
+            self._index_mmapped = False
+            self.set_search_params(nprobe=self.nprobe, ef_search=self.ef_search)
+
+    def add_items(self, items: tp.Dict[tp.Any, str]) -> None:
+        """
+        Add new items to the index. Only the added items are embedded, the index and docstore
+        are patched in place. Modifications should not run concurrently with recommendations.
+
+        Args:
+            items (Dict[Any, str]): The mapping from item ids to text information about items.
+        """
+        existing_items = [item_id for item_id in items if str(item_id) in self._item_labels]
+        if len(existing_items) > 0:
+            raise ValueError(
+                f"Items are already present in the index, use update_items instead. Got: {existing_items}"
+            )
+        if len(items) == 0:
+            return
+        self._ensure_writable_index()
+
+        docs = self.text_splitter.create_documents(
+            texts=list(items.values()),
+            # ids are stored as strings, as in item labels and in history of users
+            metadatas=list({'source': str(_id)} for _id in items.keys())
+        )
+        labels = np.arange(self._next_label, self._next_label + len(docs), dtype=np.int64)
+        self._add_to_vectorstore(self.vectorstore, docs, self._embed_documents(docs), labels)
+        self._next_label += len(docs)
+        for doc, label in zip(docs, labels.tolist()):
+            self._item_labels.setdefault(doc.metadata["source"], []).append(label)
+        if self.bm25 is not None:
+            self.bm25 = self._build_bm25()
+        self._clear_query_cache()
+
+    def update_items(self, items: tp.Dict[tp.Any, str]) -> None:
+        """
+        Replace text information of items in the index. Items missing from the index are added.
+
+        Args:
+            items (Dict[Any, str]): The mapping from item ids to new text information about items.
+        """
+        self.remove_items([item_id for item_id in items if str(item_id) in self._item_labels])
+        self.add_items(items)
+
+    def remove_items(self, item_ids: tp.List[tp.Any]) -> None:
+        """
+        Remove items from the index and docstore.
+
+        Args:
+            item_ids (List[Any]): The ids of items to remove.
+        """
+        missing_items = [item_id for item_id in item_ids if str(item_id) not in self._item_labels]
+        if len(missing_items) > 0:
+            raise ValueError(f"Items are not present in the index. Got: {missing_items}")
+        if len(item_ids) == 0:
+            return
+        if self.index_type == "hnsw":
+            raise ValueError("HNSW index does not support removal of items. The index should be rebuilt.")
+        self._ensure_writable_index()
+
+        labels = [label for item_id in item_ids for label in self._item_labels[str(item_id)]]
+        self.vectorstore.index.remove_ids(np.array(labels, dtype=np.int64))
+        self.vectorstore.docstore.delete(
+            [self.vectorstore.index_to_docstore_id.pop(label) for label in labels]
+        )
+        for item_id in item_ids:
+            del self._item_labels[str(item_id)]
+        if self.bm25 is not None:
+            self.bm25 = self._build_bm25()
+        self._clear_query_cache()
+
+    def _clear_query_cache(self) -> None:
+        # pooled query vectors are built from stored item vectors, so they are stale after the index changes
+        if self.query_cache is not None:
+            self.query_cache.clear()
+
+    def _history_weights(self, history_vectors: np.ndarray) -> np.ndarray:
+        # history is ordered from the oldest to the most recent item
+        if self.query_mode == "mean":
+            return np.ones(len(history_vectors), dtype=np.float32)
+        if self.query_mode == "recency":
+            return self.recency_decay ** np.arange(len(history_vectors) - 1, -1, -1, dtype=np.float32)
+        logits = history_vectors @ history_vectors[-1] / self.attention_temperature
+        weights = np.exp(logits - logits.max())
+        return weights
+
+    def _pool_history_vectors(self, prev_interactions: tp.List[str]) -> tp.Optional[np.ndarray]:
+        """
+        Build query vector of user by pooling stored vectors of history items.
+
+        Returns:
+            Optional[np.ndarray]: The query vector or None if no history item is present in the index.
+        """
+        cache_key = None
+        if self.query_cache is not None:
+            cache_key = (self.query_mode, tuple(str(item) for item in prev_interactions))
+            query_vector = self.query_cache.get(cache_key)
+            if query_vector is not None:
+                return query_vector
+
+        query_vector = self._compute_pooled_vector(prev_interactions)
+        if cache_key is not None and query_vector is not None:
+            self.query_cache.set(cache_key, query_vector)
+        return query_vector
+
+    def _compute_pooled_vector(self, prev_interactions: tp.List[str]) -> tp.Optional[np.ndarray]:
+        history_labels = [
+            self._item_labels[str(item)] for item in prev_interactions if str(item) in self._item_labels
+        ]
+        if len(history_labels) == 0:
+            return None
+        flat_labels = np.array([label for labels in history_labels for label in labels], dtype=np.int64)
+        chunk_vectors = self.vectorstore.index.reconstruct_batch(flat_labels)
+
+        # average chunks of the same item
+        item_positions = np.repeat(np.arange(len(history_labels)), [len(labels) for labels in history_labels])
+        history_vectors = np.zeros((len(history_labels), chunk_vectors.shape[1]), dtype=np.float32)
+        np.add.at(history_vectors, item_positions, chunk_vectors)
+        history_vectors /= np.bincount(item_positions)[:, None]
+
+        weights = self._history_weights(history_vectors)
+        return (weights[:, None] * history_vectors).sum(axis=0) / weights.sum()
+
+    def _memory_hash(self) -> str:
+        serialized = json.dumps(self.item_memory.get_memory, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
 
     def _load_from_memory(self) -> tp.List[Document]:
         documents = self.text_splitter.create_documents(
@@ -100,6 +697,11 @@ class RetrievalRecommender(Recommender):
         docs = self.text_splitter.split_documents(documents)
         return docs
 
+    def _items_text(self, item_ids: tp.List[str]) -> tp.List[str]:
+        if self.items2text is not None:
+            return list(self.items2text(list(item_ids)))
+        return [self.item2text(item) for item in item_ids]
+
     def _prepare_prev_interactions(self, prev_interactions_texts: tp.List[str]) -> str:
         prev_interactions_str = " ".join(
             [
@@ -112,16 +714,13 @@ class RetrievalRecommender(Recommender):
     def _filter_prev_interactions(
         self, reco_items: tp.List[str], prev_interactions: tp.List[str]
     ) -> tp.List[str]:
+        # removes viewed items and duplicates in one pass
+        viewed_items = set(prev_interactions)
         filtered_items = list(
-            dict.fromkeys(
-                x for x in dict.fromkeys(reco_items) if x not in dict.fromkeys(prev_interactions)
-            ).keys()
+            dict.fromkeys(x for x in reco_items if x not in viewed_items)
         )
         return filtered_items
 
-    def _set_top_k(self, top_k: int):
-        self.retriever.search_kwargs["k"] = top_k
-
     def _remove_duplicate_item_ids(self, reco_items: tp.List[str]) -> tp.List[str]:
         return list(dict.fromkeys(reco_items))
 
@@ -135,23 +734,356 @@ class RetrievalRecommender(Recommender):
         top_k: int,
         user_profile: str = "",
         filter_viewed: bool = True,
-        candidates: tp.Any = None
+        candidates: tp.Any = None,
+        nprobe: int = None,
+        ef_search: int = None,
     ) -> tp.List[tp.Any]:
+        """
+        Creating recommendations for one user. The method does not change the state of the
+        instance, so one retriever could be shared between concurrent threads.
+
+        Args:
+            prev_interactions (List[str]): The item ids of previous interactions of the user.
+            top_k (int): The number of items to recommend.
+            user_profile (str): The profile of the user.
+            filter_viewed (bool): Whether to remove previous interactions from recommendations.
+            nprobe (int, optional): Overrides the number of visited IVF clusters for this call.
+            ef_search (int, optional): Overrides the size of HNSW candidate list for this call.
+
+        Returns:
+            List[Any]: Recommended item ids.
+        """
         if len(prev_interactions) == 0:
             raise ValueError(
                 f"The user must have at least one interaction with the content."
             )
-        prev_interactions_texts = [self.item2text(item) for item in prev_interactions]
-        prev_items = self._prepare_prev_interactions(prev_interactions_texts)
-        self._set_top_k(top_k + len(prev_interactions_texts) if filter_viewed else top_k)
+        query_vector = self._pool_history_vectors(prev_interactions) if self.query_mode != "text" else None
+        prev_interactions_texts = None
+
+        if query_vector is None:
+            prev_interactions_texts = self._items_text(prev_interactions)
+            prev_items = self._prepare_prev_interactions(prev_interactions_texts)
+            query = self.query.format(user_profile=user_profile, user_history=prev_items)
+
+            if not self._matrix_search_supported():
+                # k is passed per call instead of being written to shared search_kwargs
+                k = top_k + len(prev_interactions) if filter_viewed else top_k
+                search_kwargs = {**self.search_kwargs, "k": k}
+                documents = self.vectorstore.search(query, self.search_type, **search_kwargs)
+                item_ids = self._remove_duplicate_item_ids(self.parse(documents))
+                if filter_viewed:
+                    item_ids = self._filter_prev_interactions(item_ids, prev_interactions)
+                return item_ids[:top_k]
+            query_vector = self._embed_queries([query])[0]
+
+        exclude_items = prev_interactions if filter_viewed else []
+        if self.bm25 is None:
+            return self._search_top_k_unique(query_vector, top_k, exclude_items, nprobe=nprobe, ef_search=ef_search)
+
+        if prev_interactions_texts is None:
+            prev_interactions_texts = self._items_text(prev_interactions)
+        num_candidates = max(top_k, self.fusion_candidates)
+        dense_results = self._search_top_k_unique(
+            query_vector, num_candidates, exclude_items, nprobe=nprobe, ef_search=ef_search, return_scores=True
+        )
+        lexical_results = self.bm25.search(
+            self._lexical_query(prev_interactions_texts), num_candidates, exclude_items
+        )
+        return self._fuse(dense_results, lexical_results)[:top_k]
+
+    def score(self, prev_interactions: tp.List[str], candidates: tp.List[str], user_profile: str = "") -> np.ndarray:
+        """
+        Score candidates by cosine similarity between the query vector of the user and stored vectors
+        of candidates. It is a cheap scorer for candidates re-scoring, e.g. in CascadeRanker.
+        The score of item with several chunks is the best score of its chunks.
+
+        Args:
+            prev_interactions (List[str]): The item ids of previous interactions of the user.
+            candidates (List[str]): The item ids of candidates.
+            user_profile (str): The profile of the user.
+
+        Returns:
+            np.ndarray: The scores of candidates in the input order, -inf for candidates missing from the index.
+        """
+        query_vector = self._pool_history_vectors(prev_interactions) if self.query_mode != "text" else None
+        if query_vector is None:
+            prev_items = self._prepare_prev_interactions(self._items_text(prev_interactions))
+            query_vector = self._embed_queries([self.query.format(user_profile=user_profile, user_history=prev_items)])[0]
+
+        scores = np.full(len(candidates), -np.inf, dtype=np.float32)
+        candidate_labels = [self._item_labels.get(str(item), []) for item in candidates]
+        flat_labels = np.array([label for labels in candidate_labels for label in labels], dtype=np.int64)
+        if len(flat_labels) == 0:
+            return scores
+        chunk_vectors = self.vectorstore.index.reconstruct_batch(flat_labels)
+        chunk_vectors /= np.maximum(np.linalg.norm(chunk_vectors, axis=1, keepdims=True), 1e-12)
+        chunk_scores = chunk_vectors @ (query_vector / max(np.linalg.norm(query_vector), 1e-12))
+
+        candidate_positions = np.repeat(np.arange(len(candidates)), [len(labels) for labels in candidate_labels])
+        np.maximum.at(scores, candidate_positions, chunk_scores.astype(np.float32))
+        return scores
+
+    def _lexical_query(self, prev_interactions_texts: tp.List[str]) -> str:
+        # user profile is not added, since it could be an id matching ids in the texts of items
+        return " ".join(prev_interactions_texts)
+
+    def _fuse(
+        self,
+        dense_results: tp.Tuple[tp.List[tp.Any], tp.List[float]],
+        lexical_results: tp.Tuple[tp.List[tp.Any], tp.List[float]],
+    ) -> tp.List[tp.Any]:
+        weights = [1.0 - self.lexical_weight, self.lexical_weight]
+        if self.fusion == "rrf":
+            return reciprocal_rank_fusion([dense_results[0], lexical_results[0]], weights=weights, rrf_k=self.rrf_k)
+        return weighted_score_fusion([dense_results, lexical_results], weights=weights)
+
+    @staticmethod
+    def _unique_with_scores(
+        item_ids: tp.List[tp.Any], scores: tp.List[float], exclude_items: tp.List[tp.Any] = ()
+    ) -> tp.Tuple[tp.List[tp.Any], tp.List[float]]:
+        # keeps the best (first) score of every item in one pass
+        excluded = set(exclude_items)
+        unique_scores = {}
+        for item_id, score in zip(item_ids, scores):
+            if item_id not in excluded and item_id not in unique_scores:
+                unique_scores[item_id] = score
+        return list(unique_scores.keys()), list(unique_scores.values())
+
+    def _search_top_k_unique(
+        self,
+        query_vector: np.ndarray,
+        top_k: int,
+        exclude_items: tp.List[str],
+        nprobe: int = None,
+        ef_search: int = None,
+        return_scores: bool = False,
+    ) -> tp.Union[tp.List[str], tp.Tuple[tp.List[str], tp.List[float]]]:
+        """
+        Search exactly top_k unique items that are not in exclude_items (if the index has enough items).
+        Excluded items are skipped inside FAISS with ID selector instead of over-fetching by history length.
+        If return_scores is True, similarity scores (negative distances) of items are returned as well.
+        """
+        exclude_labels = np.array(
+            [label for item in exclude_items for label in self._item_labels.get(str(item), [])], dtype=np.int64
+        )
+        batch_selector, selector = None, None
+        if len(exclude_labels) > 0:
+            batch_selector = faiss.IDSelectorBatch(exclude_labels)
+            selector = faiss.IDSelectorNot(batch_selector)
+        search_params = self._faiss_search_params(nprobe, ef_search, selector)
+
+        k = top_k
+        while True:
+            found_item_ids, found_scores = self._search_by_vectors(
+                query_vector[None, :], k, search_params=search_params, return_scores=True
+            )[0]
+            item_ids, scores = self._unique_with_scores(found_item_ids, found_scores)
+            # several chunks of one item could be found, so the search is repeated with larger k
+            if len(item_ids) >= top_k or len(found_item_ids) < k:
+                return (item_ids[:top_k], scores[:top_k]) if return_scores else item_ids[:top_k]
+            k *= 2
+
+    def _embed_query_texts(self, queries: tp.List[str]) -> tp.List[tp.List[float]]:
+        """
+        Embed queries in one forward pass keeping query encoder semantics, since asymmetric models
+        (e.g. BGE, e5, instruct embeddings) encode queries differently from documents. Embeddings could provide
+        batched query encoder with embed_queries method, otherwise queries are embedded one by one.
+        """
+        if hasattr(self.embeddings, "embed_queries"):
+            return list(self.embeddings.embed_queries(queries))
+        if isinstance(self.embeddings, HuggingFaceEmbeddings):
+            query_kwargs = getattr(self.embeddings, "query_encode_kwargs", None) or {}
+            # embed_query uses encode_kwargs if query kwargs are not set
+            if len(query_kwargs) == 0 or query_kwargs == self.embeddings.encode_kwargs:
+                return self.embeddings.embed_documents(queries)
+            if hasattr(self.embeddings, "_embed"):
+                return self.embeddings._embed(queries, query_kwargs)
+        return [self.embeddings.embed_query(query) for query in queries]
+
+    def _embed_queries(self, queries: tp.List[str]) -> tp.List[np.ndarray]:
+        """
+        Embed text queries. Queries missing from the query cache are embedded with the query encoder in one call.
+        """
+        query_vectors = [None] * len(queries)
+        cache_keys = [None] * len(queries)
+        if self.query_cache is not None:
+            for query_idx, query in enumerate(queries):
+                cache_keys[query_idx] = ("text", " ".join(query.split()))
+                query_vectors[query_idx] = self.query_cache.get(cache_keys[query_idx])
+
+        missed_idx = [query_idx for query_idx, query_vector in enumerate(query_vectors) if query_vector is None]
+        missed_vectors = self._embed_query_texts([queries[query_idx] for query_idx in missed_idx]) if missed_idx else []
+        for query_idx, query_vector in zip(missed_idx, missed_vectors):
+            query_vectors[query_idx] = np.asarray(query_vector, dtype=np.float32)
+            if self.query_cache is not None:
+                self.query_cache.set(cache_keys[query_idx], query_vectors[query_idx])
+        return query_vectors
+
+    def _matrix_search_supported(self) -> bool:
+        return self.search_type == "similarity" and len(set(self.search_kwargs) - {"k"}) == 0
+
+    def _search_by_vectors(
+        self,
+        query_vectors: np.ndarray,
+        k: int,
+        search_params: faiss.SearchParameters = None,
+        return_scores: bool = False,
+    ) -> tp.List[tp.Any]:
+        """
+        Run one matrix search over the FAISS index for all query vectors.
+        FAISS releases the GIL during search, so concurrent calls scale with cores.
+
+        Returns:
+            List[Any]: The item ids of found documents for each query, ordered by similarity.
+                If return_scores is True, the tuples of item ids and similarity scores (negative distances).
+        """
+        # copy, so normalization never changes cached query vectors
+        query_vectors = np.array(query_vectors, dtype=np.float32)
+        if self.vectorstore._normalize_L2:
+            faiss.normalize_L2(query_vectors)
+        distances, indices = self.vectorstore.index.search(query_vectors, k, params=search_params)
+
+        results = []
+        for row_distances, row in zip(distances, indices):
+            documents = [
+                self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[i])
+                for i in row
+                if i != -1
+            ]
+            item_ids = self.parse(documents)
+            results.append((item_ids, (-row_distances[row != -1]).tolist()) if return_scores else item_ids)
+        return results
+
+    def recommend_batch(
+        self,
+        prev_interactions: tp.List[tp.List[str]],
+        top_k: int,
+        user_profiles: tp.List[str] = None,
+        filter_viewed: bool = True,
+        nprobe: int = None,
+        ef_search: int = None,
+    ) -> tp.List[tp.List[tp.Any]]:
+        """
+        Creating recommendations for several users at once. Query vectors of all users are searched
+        in the index with a single matrix search.
+
+        Args:
+            prev_interactions (List[List[str]]): The item ids of previous interactions for each user.
+            top_k (int): The number of items to recommend for each user.
+            user_profiles (List[str], optional): The profiles of users. Defaults to empty profiles.
+            filter_viewed (bool): Whether to remove previous interactions from recommendations.
+            nprobe (int, optional): Overrides the number of visited IVF clusters for this call.
+            ef_search (int, optional): Overrides the size of HNSW candidate list for this call.
+
+        Returns:
+            List[List[Any]]: Recommended item ids for each user.
+        """
+        if user_profiles is None:
+            user_profiles = [""] * len(prev_interactions)
+        if len(user_profiles) != len(prev_interactions):
+            raise ValueError(
+                f"The number of user profiles should match the number of users. Got: {len(user_profiles)} and {len(prev_interactions)}"
+            )
+        if len(prev_interactions) == 0:
+            return []
+        if not self._matrix_search_supported():
+            # other search types (mmr, score threshold) and filters are not expressible as a single matrix search
+            return [
+                self.recommend(
+                    user_history, top_k, user_profile=user_profile, filter_viewed=filter_viewed,
+                    nprobe=nprobe, ef_search=ef_search,
+                )
+                for user_history, user_profile in zip(prev_interactions, user_profiles)
+            ]
+
+        query_vectors = [None] * len(prev_interactions)
+        text_queries = {}
+        lexical_queries = []
+        for user_idx, (user_history, user_profile) in enumerate(zip(prev_interactions, user_profiles)):
+            if len(user_history) == 0:
+                raise ValueError(
+                    f"The user must have at least one interaction with the content."
+                )
+            if self.query_mode != "text":
+                query_vectors[user_idx] = self._pool_history_vectors(user_history)
+            if query_vectors[user_idx] is None or self.bm25 is not None:
+                prev_interactions_texts = self._items_text(user_history)
+                if self.bm25 is not None:
+                    lexical_queries.append(self._lexical_query(prev_interactions_texts))
+            if query_vectors[user_idx] is None:
+                prev_items = self._prepare_prev_interactions(prev_interactions_texts)
+                text_queries[user_idx] = self.query.format(user_profile=user_profile, user_history=prev_items)
+
+        if len(text_queries) > 0:
+            text_query_vectors = self._embed_queries(list(text_queries.values()))
+            for user_idx, query_vector in zip(text_queries.keys(), text_query_vectors):
+                query_vectors[user_idx] = query_vector
+
+        if self.bm25 is not None:
+            return self._hybrid_search_batch(
+                query_vectors, lexical_queries, prev_interactions, top_k, filter_viewed, nprobe, ef_search
+            )
+
+        exclude_items = prev_interactions if filter_viewed else [[] for _ in prev_interactions]
+        return self._search_batch_unique(query_vectors, exclude_items, top_k, nprobe=nprobe, ef_search=ef_search)
 
-        query = self.query.format(user_profile=user_profile, user_history=prev_items)
+    def _search_batch_unique(
+        self,
+        query_vectors: tp.List[np.ndarray],
+        exclude_items: tp.List[tp.List[str]],
+        top_k: int,
+        nprobe: int = None,
+        ef_search: int = None,
+        return_scores: bool = False,
+    ) -> tp.List[tp.Any]:
+        """
+        Search top_k unique items for each user without items excluded for the user. Users with at most top_k
+        excluded items share one matrix search over-fetching by the longest of their exclusion lists. Users with
+        longer exclusion lists are searched separately with exclusion inside FAISS, so one heavy user does not
+        inflate k of the whole batch.
+        """
+        results = [None] * len(query_vectors)
+        light_users = [user_idx for user_idx, user_items in enumerate(exclude_items) if len(user_items) <= top_k]
+        if len(light_users) > 0:
+            k = top_k + max(len(exclude_items[user_idx]) for user_idx in light_users)
+            batch_results = self._search_by_vectors(
+                [query_vectors[user_idx] for user_idx in light_users], k,
+                search_params=self._faiss_search_params(nprobe, ef_search), return_scores=True,
+            )
+            for user_idx, (item_ids, scores) in zip(light_users, batch_results):
+                item_ids, scores = self._unique_with_scores(item_ids, scores, exclude_items[user_idx])
+                if len(item_ids) >= top_k:
+                    results[user_idx] = (item_ids[:top_k], scores[:top_k]) if return_scores else item_ids[:top_k]
 
-        documents = self.retriever.get_relevant_documents(query)
-        parsed_item_ids = self.parse(documents)
-        item_ids = self._remove_duplicate_item_ids(parsed_item_ids)
+        for user_idx, result in enumerate(results):
+            if result is None:
+                # heavy users and the rare case of many duplicate chunks
+                results[user_idx] = self._search_top_k_unique(
+                    np.asarray(query_vectors[user_idx], dtype=np.float32), top_k, exclude_items[user_idx],
+                    nprobe=nprobe, ef_search=ef_search, return_scores=return_scores,
+                )
+        return results
 
-        if filter_viewed:
-            item_ids = self._filter_prev_interactions(item_ids, prev_interactions)
-        item_ids = item_ids[:top_k]
-        return item_ids
\ No newline at end of file
+    def _hybrid_search_batch(
+        self,
+        query_vectors: tp.List[np.ndarray],
+        lexical_queries: tp.List[str],
+        prev_interactions: tp.List[tp.List[str]],
+        top_k: int,
+        filter_viewed: bool,
+        nprobe: int = None,
+        ef_search: int = None,
+    ) -> tp.List[tp.List[tp.Any]]:
+        """
+        Fuse one dense matrix search with one sparse lexical scoring for all users.
+        """
+        num_candidates = max(top_k, self.fusion_candidates)
+        exclude_items = prev_interactions if filter_viewed else [[] for _ in prev_interactions]
+        dense_batch = self._search_batch_unique(
+            query_vectors, exclude_items, num_candidates, nprobe=nprobe, ef_search=ef_search, return_scores=True
+        )
+        lexical_batch = self.bm25.search_batch(lexical_queries, num_candidates, exclude_items)
+        return [
+            self._fuse(dense_results, lexical_results)[:top_k]
+            for dense_results, lexical_results in zip(dense_batch, lexical_batch)
+        ]
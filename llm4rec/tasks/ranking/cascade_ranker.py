@@ -0,0 +1,151 @@
+import typing as tp
+import inspect
+import threading
+
+import numpy as np
+import torch
+
+from llm4rec.tasks.base_recommender import Recommender
+
+
+class CascadeRanker(Recommender):
+    """
+    Two-stage ranker: a cheap scorer re-scores all candidates and only the uncertain head, i.e. top_m
+    candidates and candidates with scores within margin of the cut-off score, is ranked by the expensive
+    ranker (e.g. RankerRecommender). The rest of candidates follow the head in the order of cheap scores.
+
+    Attributes:
+        scorer: The cheap scorer with score(prev_interactions, candidates) method or a callable with the same
+            arguments, e.g. SequentialRecBoleModelWrapper, RetrievalRecommender or LikelihoodRanker.
+        ranker (Recommender): The expensive ranker with recommend(prev_interactions, candidates, user_profile) method.
+        top_m (int): The number of best candidates by cheap scores which are passed to the ranker.
+        margin (Optional[float]): Candidates with cheap scores within margin below the score of top_m-th
+            candidate are passed to the ranker as well.
+        max_head_size (Optional[int]): The maximum number of candidates passed to the ranker.
+        count_saved_tokens (bool): Whether to estimate prompt tokens saved by the cascade.
+    """
+
+    def __init__(
+        self,
+        scorer: tp.Any,
+        ranker: Recommender,
+        top_m: int = 10,
+        margin: float = None,
+        max_head_size: int = None,
+        count_saved_tokens: bool = False,
+    ) -> None:
+        """
+        Initializes CascadeRanker.
+
+        Args:
+            scorer: The cheap scorer with score method or callable returning scores of candidates.
+            ranker (Recommender): The expensive ranker of the head.
+            top_m (int): The number of best candidates by cheap scores passed to the ranker. Defaults to 10.
+            margin (float, optional): The margin below the cut-off score within which candidates are considered
+                uncertain and are passed to the ranker too. Defaults to None (only top_m candidates).
+            max_head_size (int, optional): The maximum number of candidates passed to the ranker
+                including uncertain ones. Defaults to None (unbounded).
+            count_saved_tokens (bool): Whether to estimate prompt tokens saved by the cascade. It builds and counts
+                the prompt of all candidates for every user, so it is disabled by default. Available for rankers
+                with count_prompt_tokens method, e.g. RankerRecommender. Defaults to False.
+        """
+        if top_m < 1:
+            raise ValueError(f"The number of candidates passed to the ranker should be positive. Got: {top_m}")
+        if max_head_size is not None and max_head_size < top_m:
+            raise ValueError(f"The maximum head size should be at least top_m {top_m}. Got: {max_head_size}")
+        self.scorer = scorer
+        self.ranker = ranker
+        self.top_m = top_m
+        self.margin = margin
+        self.max_head_size = max_head_size
+        self.count_saved_tokens = count_saved_tokens
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self._stats = {
+                "users": 0,
+                "candidates": 0,
+                "candidates_to_ranker": 0,
+                "ranker_calls": 0,
+                "ranker_calls_saved": 0,
+                "prompt_tokens_saved": 0,
+            }
+
+    @property
+    def stats(self) -> tp.Dict[str, int]:
+        """
+        Return savings of the cascade.
+
+        Returns:
+            Dict[str, int]: The number of ranked users, all candidates, candidates passed to the ranker,
+                LLM calls of the ranker, LLM calls saved compared to ranking all candidates (including windows
+                of windowed rankers) and estimated prompt tokens saved (only with count_saved_tokens).
+        """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _score(self, prev_interactions: tp.List[str], candidates: tp.List[str], user_profile: str = None) -> np.ndarray:
+        score_fn = self.scorer.score if hasattr(self.scorer, "score") else self.scorer
+        kwargs = {}
+        if user_profile is not None and "user_profile" in inspect.signature(score_fn).parameters:
+            kwargs["user_profile"] = user_profile
+        scores = score_fn(prev_interactions, candidates, **kwargs)
+        if isinstance(scores, torch.Tensor):
+            scores = scores.detach().float().cpu().numpy()
+        return np.asarray(scores, dtype=np.float32)
+
+    def _head_size(self, sorted_scores: np.ndarray) -> int:
+        head_size = min(self.top_m, len(sorted_scores))
+        if self.margin is not None and head_size > 0 and np.isfinite(sorted_scores[head_size - 1]):
+            cutoff = sorted_scores[head_size - 1]
+            # scores are sorted, so the uncertain candidates directly follow top_m,
+            # candidates without score (e.g. missing from the index) are never uncertain
+            rest_scores = sorted_scores[head_size:]
+            head_size += int(np.count_nonzero(np.isfinite(rest_scores) & (rest_scores >= cutoff - self.margin)))
+        if self.max_head_size is not None:
+            head_size = min(head_size, self.max_head_size)
+        return head_size
+
+    def _llm_calls(self, num_candidates: int) -> int:
+        if hasattr(self.ranker, "num_llm_calls"):
+            return self.ranker.num_llm_calls(num_candidates)
+        return int(num_candidates >= 2)
+
+    def _saved_prompt_tokens(
+        self, prev_interactions: tp.List[str], candidates: tp.List[str], head: tp.List[str], user_profile: str
+    ) -> int:
+        # estimated as the difference of single prompts for all candidates and for the head
+        if not (self.count_saved_tokens and hasattr(self.ranker, "count_prompt_tokens")):
+            return 0
+        saved_tokens = self.ranker.count_prompt_tokens(prev_interactions, candidates, user_profile)
+        if len(head) >= 2:
+            saved_tokens -= self.ranker.count_prompt_tokens(prev_interactions, head, user_profile)
+        return saved_tokens
+
+    def recommend(
+        self, prev_interactions: tp.List[str], candidates: tp.List[str], user_profile: str = None
+    ) -> tp.List[tp.Any]:
+        scores = self._score(prev_interactions, candidates, user_profile)
+        order = np.argsort(-scores, kind="stable")
+        sorted_candidates = [candidates[idx] for idx in order]
+        head_size = self._head_size(scores[order])
+        head, tail = sorted_candidates[:head_size], sorted_candidates[head_size:]
+
+        ranker_called = len(head) >= 2
+        if ranker_called:
+            head = self.ranker.recommend(prev_interactions, head, user_profile)
+        saved_tokens = 0
+        if len(tail) > 0 and len(candidates) >= 2:
+            saved_tokens = self._saved_prompt_tokens(prev_interactions, candidates, head, user_profile)
+        ranker_calls = self._llm_calls(len(head))
+
+        with self._stats_lock:
+            self._stats["users"] += 1
+            self._stats["candidates"] += len(candidates)
+            self._stats["candidates_to_ranker"] += len(head) if ranker_called else 0
+            self._stats["ranker_calls"] += ranker_calls
+            self._stats["ranker_calls_saved"] += self._llm_calls(len(candidates)) - ranker_calls
+            self._stats["prompt_tokens_saved"] += saved_tokens
+        return list(head) + tail
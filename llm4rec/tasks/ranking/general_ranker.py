@@ -1,9 +1,17 @@
 from langchain import PromptTemplate
 from langchain.schema import AIMessage
 from llm4rec.tasks.base_recommender import Recommender
+from llm4rec.utils.cache import BaseCache
+from llm4rec.utils.rate_limit import TokenBucket, retry_with_backoff, aretry_with_backoff
+from llm4rec.utils.prompt_building import get_token_counter
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.language_models.llms import BaseLLM
+from concurrent.futures import ThreadPoolExecutor
 import typing as tp
+import asyncio
+import hashlib
+import json
+import threading
 import re
 import warnings
 
@@ -15,8 +23,41 @@ class RankerRecommender(Recommender):
     Attributes:
         llm (BaseChatModel, BaseLLM): LLM model for ranking.
         prompt (str): Prompt used for ranking by LLM.
+        response_cache (Optional[BaseCache]): Cache of LLM responses keyed on prompt and model identity.
+        rate_limiter (Optional[TokenBucket]): Limiter of LLM requests rate.
+        window_size (Optional[int]): The maximum number of candidates in one prompt.
+        window_stride (Optional[int]): The step of sliding window or the number of winners of tournament group.
+        window_strategy (str): The strategy of ranking candidates which do not fit into one window.
+        parse_mode (str): The way candidates are referred to in LLM output.
+        max_prompt_tokens (Optional[int]): The token budget of one prompt.
+        last_prompt_tokens (int): The number of tokens in the last prompt sent to LLM.
+        total_prompt_tokens (int): The number of tokens in all prompts sent to LLM.
+        output_format (str): The format of LLM response: free text or JSON list of candidate ids.
     """
 
+    window_strategies = ["sliding", "tournament"]
+    parse_modes = ["title", "id"]
+    id_instruction = (
+        "\nEach candidate item is given with its id in square brackets. "
+        + "Please show me your ranking results with the ids of items in square brackets, e.g. [id], and order numbers."
+    )
+    # counters which change during evaluation and do not describe the ranker
+    runtime_attributes = ["last_prompt_tokens", "total_prompt_tokens"]
+    output_formats = ["text", "json"]
+    json_instruction = (
+        "\nEach candidate item is given with its id in square brackets. "
+        + 'Answer only with JSON object {"ranking": [...]} with the ids of all candidate items '
+        + "ordered from the most to the least likely, without any other text."
+    )
+    json_retry_instruction = '\nYour previous answer was invalid. Answer only with JSON object {"ranking": [...]} with ids of all candidates.'
+    ranking_schema = {
+        "title": "Ranking",
+        "description": "Ids of candidate items ordered from the most to the least likely to be interacted with next.",
+        "type": "object",
+        "properties": {"ranking": {"type": "array", "items": {"type": "string"}}},
+        "required": ["ranking"],
+    }
+
     default_prompts = {
         "sequential": PromptTemplate(
             template="I've been interested in the following items in the past in order:\n{prev_interactions}.\n\n"
@@ -69,6 +110,22 @@ class RankerRecommender(Recommender):
         item2text: tp.Callable,
         custom_prompt: str = None,
         type_prompt: str = "sequential",
+        response_cache: BaseCache = None,
+        max_concurrency: int = 8,
+        requests_per_minute: float = None,
+        max_retries: int = 3,
+        retry_base_delay: float = 1.0,
+        window_size: int = None,
+        window_stride: int = None,
+        window_strategy: str = "sliding",
+        parse_mode: str = "title",
+        max_prompt_tokens: int = None,
+        item_fields: tp.List[str] = None,
+        item2attr: tp.Callable = None,
+        compact_ids: bool = False,
+        token_counter: tp.Callable[[str], int] = None,
+        items2text: tp.Callable = None,
+        output_format: str = "text",
     ) -> None:
         """
         Initializes Ranker.
@@ -77,6 +134,45 @@ class RankerRecommender(Recommender):
             llm (BaseChatModel, BaseLLM): LLM model for ranking.
             custom_prompt (str): Custom prompt for ranking.
             type_prompt (str): Type of default prompt for ranking. Available options: ['sequential', 'in_context', 'recency']
+            response_cache (BaseCache, optional): Cache of LLM responses, e.g. LRUCache or SQLiteCache from llm4rec.utils.
+                Responses are keyed on the hash of the prompt and the model identity. Defaults to None (no caching).
+            max_concurrency (int): The maximum number of concurrent LLM requests in batch and tournament ranking.
+                Defaults to 8.
+            requests_per_minute (float, optional): The limit of LLM requests rate shared by all calls of the ranker.
+                Defaults to None (no limit).
+            max_retries (int): The number of retries of failed LLM request with exponential backoff. Defaults to 3.
+            retry_base_delay (float): The delay in seconds before the first retry. Defaults to 1.0.
+            window_size (int, optional): The maximum number of candidates in one prompt. Larger candidate lists
+                are ranked by several prompts according to window_strategy. Defaults to None (all candidates in one prompt).
+            window_stride (int, optional): For 'sliding' strategy the step between windows, for 'tournament' strategy
+                the number of candidates of each group which advance to the next round. Should be less than window_size.
+                Defaults to window_size // 2.
+            window_strategy (str): The strategy of windowed ranking. Available options: ['sliding', 'tournament'].
+                'sliding' ranks overlapping windows from the end to the beginning of the candidate list, so the best
+                candidates move forward. 'tournament' ranks groups of each round in parallel and ranks the winners
+                of groups in the next round until they fit into one window. Defaults to 'sliding'.
+            parse_mode (str): The way ranked candidates are found in LLM output. Available options: ['title', 'id'].
+                'title' matches candidate titles after order numbers. 'id' shows candidates with their ids
+                in square brackets and asks LLM to answer with ids. Defaults to 'title'.
+            max_prompt_tokens (int, optional): The token budget of one prompt. The oldest history items are dropped
+                until the prompt fits into the budget. Defaults to None (no budget).
+            item_fields (List[str], optional): The item attributes kept in item texts of the prompt,
+                e.g. ['title', 'genre']. Defaults to None (full item2text output).
+            item2attr (Callable, optional): The function returning dictionary of item attributes by item id,
+                e.g. RecboleSeqDataset.item_token2attr. It is used with item_fields instead of parsing item texts.
+            compact_ids (bool): Whether to refer to candidates by short aliases [1], [2], ... instead of item ids.
+                Available only with parse_mode 'id' or output_format 'json'. Defaults to False.
+            token_counter (Callable, optional): The function counting tokens of text.
+                Defaults to tiktoken counter with fallback to character-based estimate.
+            items2text (Callable, optional): The bulk version of item2text returning texts of list of items,
+                e.g. RecboleSeqDataset.item_tokens2text. Texts of history and candidates are then looked up
+                in one call. Defaults to None (item2text is called for each item).
+            output_format (str): The format of LLM response. Available options: ['text', 'json'].
+                'json' shows candidates with their ids and requests JSON object with ranked ids. Chat models
+                with tool calling are asked through with_structured_output, others through the prompt.
+                Responses which are not JSON or do not rank all candidates are retried once with a short reminder,
+                then the partial ranking is completed with missing candidates or the response is parsed as text.
+                Defaults to 'text'.
         """
         if custom_prompt:
             self.prompt = custom_prompt
@@ -88,42 +184,256 @@ class RankerRecommender(Recommender):
             self.prompt = self.default_prompts[type_prompt]
         self.llm = llm
         self.item2text = item2text
+        self.items2text = items2text
+        self.response_cache = response_cache
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = TokenBucket(requests_per_minute / 60) if requests_per_minute else None
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+
+        if window_strategy not in self.window_strategies:
+            raise ValueError(
+                f"The window strategy should be one of: {self.window_strategies}. Got: {window_strategy}"
+            )
+        if window_size is not None:
+            if window_size < 2:
+                raise ValueError(f"The window size should be at least 2. Got: {window_size}")
+            window_stride = window_stride if window_stride is not None else max(window_size // 2, 1)
+            if not 0 < window_stride < window_size:
+                raise ValueError(
+                    f"The window stride should be positive and less than window size {window_size}. Got: {window_stride}"
+                )
+        self.window_size = window_size
+        self.window_stride = window_stride
+        self.window_strategy = window_strategy
+
+        if parse_mode not in self.parse_modes:
+            raise ValueError(f"The parse mode should be one of: {self.parse_modes}. Got: {parse_mode}")
+        self.parse_mode = parse_mode
+
+        if output_format not in self.output_formats:
+            raise ValueError(f"The output format should be one of: {self.output_formats}. Got: {output_format}")
+        self.output_format = output_format
+        self._structured_llm = None
+        if output_format == "json" and hasattr(llm, "with_structured_output"):
+            try:
+                # raw output is kept, so malformed tool calls and refusals are retried instead of raising
+                self._structured_llm = llm.with_structured_output(self.ranking_schema, include_raw=True)
+            except NotImplementedError:
+                warnings.warn("The LLM does not support structured output, JSON is requested by prompt instead")
+        # candidates are shown and referred to by ids
+        self._use_ids = parse_mode == "id" or output_format == "json"
+
+        if compact_ids and not self._use_ids:
+            raise ValueError(f"Compact ids are available only with parse mode 'id' or JSON output. Got: {parse_mode}")
+        self.compact_ids = compact_ids
+        self.max_prompt_tokens = max_prompt_tokens
+        self.item_fields = item_fields
+        self.item2attr = item2attr
+        self.token_counter = token_counter if token_counter is not None else get_token_counter()
+        self.last_prompt_tokens = 0
+        self.total_prompt_tokens = 0
+        self._tokens_lock = threading.Lock()
+
+    def _llm_identity(self) -> str:
+        # the parameters that change the output of the model for the same prompt
+        params = [type(self.llm).__name__]
+        if self._structured_llm is not None:
+            params.append("structured_output")
+        for attr in ["model_name", "model", "model_id", "repo_id", "temperature", "max_tokens", "seed"]:
+            value = getattr(self.llm, attr, None)
+            if value is not None and isinstance(value, (str, int, float)):
+                params.append(f"{attr}={value}")
+        return ";".join(params)
+
+    def _cache_key(self, prompt: str) -> str:
+        return hashlib.sha256((self._llm_identity() + "\n" + prompt).encode("utf-8")).hexdigest()
+
+    def _get_cached(self, prompt: str) -> tp.Tuple[tp.Optional[str], tp.Optional[str]]:
+        if self.response_cache is None:
+            return None, None
+        cache_key = self._cache_key(prompt)
+        return cache_key, self.response_cache.get(cache_key)
+
+    @staticmethod
+    def _unwrap_structured(response: tp.Any) -> tp.Any:
+        """
+        Take the parsed ranking from structured output with raw message. If the output was not parsed,
+        the raw content (or the arguments of invalid tool call) is returned to be validated as JSON or text.
+        """
+        if not (isinstance(response, dict) and "raw" in response):
+            return response
+        if response.get("parsing_error") is None and response.get("parsed") is not None:
+            return response["parsed"]
+        raw = response["raw"]
+        content = raw.content if isinstance(raw, AIMessage) else raw
+        invalid_tool_calls = getattr(raw, "invalid_tool_calls", None)
+        if not content and invalid_tool_calls:
+            content = invalid_tool_calls[0].get("args") or ""
+        return content if isinstance(content, str) else json.dumps(content)
+
+    def _store_response(self, cache_key: tp.Optional[str], response: tp.Any) -> str:
+        response = self._unwrap_structured(response)
+        if isinstance(response, AIMessage):
+            response = response.content
+        elif not isinstance(response, str):
+            # structured output is stored as JSON, so cached and fresh responses are parsed the same way
+            response = json.dumps(response.dict() if hasattr(response, "dict") else response)
+        if cache_key is not None:
+            self.response_cache.set(cache_key, response)
+        return response
+
+    def _record_prompt_tokens(self, prompt: str) -> None:
+        num_tokens = self.token_counter(prompt)
+        with self._tokens_lock:
+            self.last_prompt_tokens = num_tokens
+            self.total_prompt_tokens += num_tokens
+
+    def _invoke(self, prompt: str) -> str:
+        """
+        Call LLM with prompt. Responses are read from and written to response cache if it is set.
+        Requests are rate limited and retried with backoff on failures.
+        """
+        cache_key, cached_response = self._get_cached(prompt)
+        if cached_response is not None:
+            return cached_response
+        self._record_prompt_tokens(prompt)
+
+        def call_llm():
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            if self._structured_llm is not None:
+                return self._structured_llm.invoke(prompt)
+            return self.llm.invoke(prompt)
+
+        response = retry_with_backoff(call_llm, self.max_retries, self.retry_base_delay)
+        return self._store_response(cache_key, response)
+
+    async def _ainvoke(self, prompt: str, semaphore: asyncio.Semaphore = None) -> str:
+        """
+        Asynchronous version of _invoke. The number of concurrent requests is limited by semaphore.
+        """
+        cache_key, cached_response = self._get_cached(prompt)
+        if cached_response is not None:
+            return cached_response
+        self._record_prompt_tokens(prompt)
+
+        async def call_llm():
+            if self.rate_limiter is not None:
+                await self.rate_limiter.aacquire()
+            if self._structured_llm is not None:
+                return await self._structured_llm.ainvoke(prompt)
+            return await self.llm.ainvoke(prompt)
+
+        if semaphore is not None:
+            async with semaphore:
+                response = await aretry_with_backoff(call_llm, self.max_retries, self.retry_base_delay)
+        else:
+            response = await aretry_with_backoff(call_llm, self.max_retries, self.retry_base_delay)
+        return self._store_response(cache_key, response)
+
+    @staticmethod
+    def _candidate_title(candidate_text: str) -> str:
+        # the title is the value of the first field of "field: value; field: value" item text
+        fields = candidate_text.split(";")[0].split(":")
+        return (fields[1] if len(fields) > 1 else candidate_text).strip()
+
+    def _candidate_matcher(
+        self, candidate_ids: tp.List[str], candidate_texts: tp.List[str]
+    ) -> tp.Tuple[re.Pattern, tp.Dict[str, tp.List[int]]]:
+        """
+        Compile one pattern matching any candidate in LLM output.
+
+        Returns:
+            Tuple[re.Pattern, Dict[str, List[int]]]: The pattern with the candidate reference as the first group
+                and the mapping from the reference to positions of candidates.
+        """
+        if self._use_ids:
+            references = self._candidate_aliases(candidate_ids)
+        else:
+            references = [self._candidate_title(text) for text in candidate_texts]
+
+        reference_positions = {}
+        for idx, reference in enumerate(references):
+            if reference:
+                reference_positions.setdefault(reference, []).append(idx)
+        # longer references go first, so titles which are prefixes of other titles do not shadow them
+        alternation = "|".join(re.escape(reference) for reference in sorted(reference_positions, key=len, reverse=True))
+        if not alternation:
+            alternation = "(?!)"
+        if self._use_ids:
+            # ids are in square brackets in text answers and in quotes in JSON answers
+            pattern = re.compile(rf"[\[\"']\s*({alternation})\s*[\]\"']")
+        else:
+            pattern = re.compile(rf"\d\.\s*({alternation})")
+        return pattern, reference_positions
 
     def _parse(
         self, document: tp.Union[str, AIMessage], candidate_ids: tp.List[str], candidate_texts: tp.List[str]
     ) -> tp.List[tp.Any]:
         """
-        Parses the output of LLM by sorting the occurences of each title text from candidate_items.
-        The parsing method is unstable and must be carefully implemented for each model.
+        Parses the output of LLM by sorting the first occurences of each candidate in the output.
+        All candidates are matched by one compiled pattern in a single pass over the output.
+        Candidates which are not found keep their relative order after the found ones.
 
         Args:
             document (str, AIMessage): The output from LLM.
-            candidates (Dict[str, str]): Candidate items with text item info.
+            candidate_ids (List[str]): Candidate item ids.
+            candidate_texts (List[str]): Text info of candidate items.
         """
         if isinstance(document, AIMessage):
             document = document.content
-            
+
         document = document.replace("**", "")
-        positions = []
-        for idx, candidate in enumerate(candidate_texts):
-            try:
-                candidate = candidate.split(";")[0].split(":")[1]
-            except:
-                candidate = candidate
-            candidate_match = re.search(f"\d\.\s*{candidate}", document)
-            if candidate_match:
-                positions.append(candidate_match.start())
-            else:
-                positions.append(len(document) + idx)
-        
+        pattern, reference_positions = self._candidate_matcher(candidate_ids, candidate_texts)
+
+        positions = [len(document) + idx for idx in range(len(candidate_ids))]
+        # candidates with the same reference are assigned to its occurrences in order
+        next_duplicate = dict.fromkeys(reference_positions, 0)
+        for candidate_match in pattern.finditer(document):
+            reference = candidate_match.group(1)
+            duplicates = reference_positions[reference]
+            if next_duplicate[reference] < len(duplicates):
+                positions[duplicates[next_duplicate[reference]]] = candidate_match.start()
+                next_duplicate[reference] += 1
+
         ranked_item_ids = [
-            cand_id for rank, cand_id in sorted(zip(positions, list(candidate_ids)))
+            cand_id for rank, cand_id in sorted(zip(positions, list(candidate_ids)), key=lambda pair: pair[0])
         ]
         return ranked_item_ids
 
-    def recommend(
-        self, prev_interactions: tp.List[str], candidates: tp.List[str],  user_profile: str= None
-    ) -> tp.List[tp.Any]:
+    def _candidate_aliases(self, candidate_ids: tp.List[str]) -> tp.List[str]:
+        if self.compact_ids:
+            return [str(idx + 1) for idx in range(len(candidate_ids))]
+        return [str(candidate_id) for candidate_id in candidate_ids]
+
+    def _item_text(self, item_id: str) -> str:
+        if self.item_fields is None:
+            return self.item2text(item_id)
+        if self.item2attr is not None:
+            attr = self.item2attr(item_id)
+        else:
+            # item texts are built as "field:value; field:value" by datasets
+            attr = dict(
+                (field.split(":", 1) + [""])[:2] for field in self.item2text(item_id).split("; ")
+            )
+            attr = {key.strip(): value.strip() for key, value in attr.items()}
+        return "; ".join([f"{field}:{attr[field]}" for field in self.item_fields if field in attr])
+
+    def _items_text(self, item_ids: tp.List[str]) -> tp.List[str]:
+        if self.items2text is not None and self.item_fields is None:
+            return list(self.items2text(item_ids))
+        return [self._item_text(item_id) for item_id in item_ids]
+
+    def _build_prompt(
+        self, prev_interactions: tp.List[str], candidates: tp.List[str], user_profile: str = None
+    ) -> tp.Tuple[str, tp.List[str]]:
+        """
+        Build ranking prompt for the user.
+
+        Returns:
+            Tuple[str, List[str]]: The prompt and texts of candidate items.
+        """
         if len(candidates) < 2:
             raise ValueError(f"User has to have at least two candidate for ranking")
         if len(prev_interactions) < 1:
@@ -131,8 +441,13 @@ class RankerRecommender(Recommender):
                 f"User should have previous interaction data available for ranking"
             )
         
-        prev_items_texts = [self.item2text(item_id) for item_id in prev_interactions]#list(prev_interactions.values())
-        candidate_items_texts = [self.item2text(item_id) for item_id in candidates]#list(candidates.values())
+        items_texts = self._items_text(list(prev_interactions) + list(candidates))
+        prev_items_texts = items_texts[: len(prev_interactions)]
+        candidate_items_texts = items_texts[len(prev_interactions) :]
+        if self._use_ids:
+            candidate_items_texts = [
+                f"[{alias}] {text}" for alias, text in zip(self._candidate_aliases(candidates), candidate_items_texts)
+            ]
 
         # Get last item and next item info for in_context and recency prompts
         last_item = prev_items_texts[-1]
@@ -144,19 +459,132 @@ class RankerRecommender(Recommender):
             elif len(prev_interactions) > 0:
                 prev_items_texts = prev_items_texts[:-1]
         
-        prompt = self.prompt.format(
-            prev_interactions=",\n".join(prev_items_texts),
-            num_candidates=len(candidate_items_texts),
-            candidates=",\n".join(candidate_items_texts),
-            next_item=next_item,
-            last_item=last_item,
+        def format_prompt(history_texts):
+            prompt = self.prompt.format(
+                prev_interactions=",\n".join(history_texts),
+                num_candidates=len(candidate_items_texts),
+                candidates=",\n".join(candidate_items_texts),
+                next_item=next_item,
+                last_item=last_item,
+            )
+            if self.output_format == "json":
+                prompt += self.json_instruction
+            elif self.parse_mode == "id":
+                prompt += self.id_instruction
+            if user_profile is not None:
+                prompt = "My profile: "+ user_profile +'.\n' + prompt
+            return prompt
+
+        prompt = format_prompt(prev_items_texts)
+        if self.max_prompt_tokens is not None:
+            prompt = self._fit_prompt_budget(prompt, prev_items_texts, format_prompt)
+        return prompt, candidate_items_texts
+
+    def _fit_prompt_budget(
+        self, prompt: str, prev_items_texts: tp.List[str], format_prompt: tp.Callable[[tp.List[str]], str]
+    ) -> str:
+        """
+        Drop the oldest history items until the prompt fits into max_prompt_tokens.
+        """
+        excess = self.token_counter(prompt) - self.max_prompt_tokens
+        if excess <= 0:
+            return prompt
+        # drop as many items as the excess requires at once, then correct the estimate by recounting
+        num_dropped = 0
+        while num_dropped < len(prev_items_texts) - 1 and excess > 0:
+            excess -= self.token_counter(prev_items_texts[num_dropped] + ",\n")
+            num_dropped += 1
+        prompt = format_prompt(prev_items_texts[num_dropped:])
+        while self.token_counter(prompt) > self.max_prompt_tokens and num_dropped < len(prev_items_texts) - 1:
+            num_dropped += 1
+            prompt = format_prompt(prev_items_texts[num_dropped:])
+
+        if self.token_counter(prompt) > self.max_prompt_tokens:
+            warnings.warn(
+                f"The prompt does not fit into {self.max_prompt_tokens} tokens even with one history item. "
+                + "Consider using item_fields, compact_ids or smaller window_size"
+            )
+        return prompt
+
+    def _parse_json(
+        self, document: tp.Union[str, AIMessage], candidate_ids: tp.List[str], require_complete: bool = True
+    ) -> tp.Optional[tp.List[tp.Any]]:
+        """
+        Parse and validate JSON ranking of candidates. Unknown and repeated ids are skipped. The ranking
+        is valid only if it covers all candidates, unless require_complete is False, then candidates missing
+        from the ranking keep their relative order after the ranked ones.
+
+        Returns:
+            Optional[List[Any]]: Ranked candidates or None if the response has no valid ranking.
+        """
+        if isinstance(document, AIMessage):
+            document = document.content
+        try:
+            ranking = json.loads(document)
+        except (TypeError, ValueError):
+            # the object could be wrapped in text or markdown code block
+            json_match = re.search(r"\{.*\}|\[.*\]", document or "", flags=re.DOTALL)
+            try:
+                ranking = json.loads(json_match.group(0)) if json_match else None
+            except ValueError:
+                ranking = None
+        if isinstance(ranking, dict):
+            ranking = ranking.get("ranking")
+        if not isinstance(ranking, list):
+            return None
+
+        alias_positions = {alias: idx for idx, alias in enumerate(self._candidate_aliases(candidate_ids))}
+        ranked_positions = dict.fromkeys(
+            alias_positions[str(alias).strip("[] ")] for alias in ranking if str(alias).strip("[] ") in alias_positions
         )
+        if len(ranked_positions) == 0 or (require_complete and len(ranked_positions) < len(candidate_ids)):
+            return None
+        positions = list(ranked_positions) + [idx for idx in range(len(candidate_ids)) if idx not in ranked_positions]
+        return [candidate_ids[idx] for idx in positions]
 
-        if user_profile is not None:
-            prompt = "My profile: "+ user_profile +'.\n' + prompt
+    def _rank_prompt(self, prompt: str, candidates: tp.List[str], candidate_items_texts: tp.List[str]) -> tp.List[tp.Any]:
+        result = self._invoke(prompt)
+        if self.output_format == "json":
+            ranked_items = self._parse_json(result, candidates)
+            if ranked_items is None:
+                result = self._invoke(prompt + self.json_retry_instruction)
+                ranked_items = self._parse_json(result, candidates)
+            if ranked_items is not None:
+                return ranked_items
+            # the partial ranking of the retry is still better than text parsing
+            ranked_items = self._parse_json(result, candidates, require_complete=False)
+            if ranked_items is not None:
+                warnings.warn("The JSON ranking of LLM does not cover all candidates, missing ones keep their order")
+                return ranked_items
+            warnings.warn("The LLM response is not valid JSON ranking, it is parsed as text")
+        return self._rank_from_response(result, candidates, candidate_items_texts)
 
-        result = self.llm.invoke(prompt)
+    async def _arank_prompt(
+        self,
+        prompt: str,
+        candidates: tp.List[str],
+        candidate_items_texts: tp.List[str],
+        semaphore: asyncio.Semaphore = None,
+    ) -> tp.List[tp.Any]:
+        result = await self._ainvoke(prompt, semaphore)
+        if self.output_format == "json":
+            ranked_items = self._parse_json(result, candidates)
+            if ranked_items is None:
+                result = await self._ainvoke(prompt + self.json_retry_instruction, semaphore)
+                ranked_items = self._parse_json(result, candidates)
+            if ranked_items is not None:
+                return ranked_items
+            # the partial ranking of the retry is still better than text parsing
+            ranked_items = self._parse_json(result, candidates, require_complete=False)
+            if ranked_items is not None:
+                warnings.warn("The JSON ranking of LLM does not cover all candidates, missing ones keep their order")
+                return ranked_items
+            warnings.warn("The LLM response is not valid JSON ranking, it is parsed as text")
+        return self._rank_from_response(result, candidates, candidate_items_texts)
 
+    def _rank_from_response(
+        self, result: str, candidates: tp.List[str], candidate_items_texts: tp.List[str]
+    ) -> tp.List[tp.Any]:
         ranked_items = self._parse(result, candidates, candidate_items_texts)
 
         if sum(
@@ -168,4 +596,251 @@ class RankerRecommender(Recommender):
             warnings.warn(
                 "The ranking stage failed. The order of candidates remained the same"
             )
-        return ranked_items
\ No newline at end of file
+        return ranked_items
+
+    def recommend(
+        self, prev_interactions: tp.List[str], candidates: tp.List[str],  user_profile: str= None
+    ) -> tp.List[tp.Any]:
+        if self.window_size is not None and len(candidates) > self.window_size:
+            # windows are ranked with blocking calls, so no event loop is started per user
+            if self.window_strategy == "sliding":
+                return self._sliding_window_rank(prev_interactions, candidates, user_profile)
+            return self._tournament_rank(prev_interactions, candidates, user_profile)
+        prompt, candidate_items_texts = self._build_prompt(prev_interactions, candidates, user_profile)
+        return self._rank_prompt(prompt, candidates, candidate_items_texts)
+
+    def count_prompt_tokens(
+        self, prev_interactions: tp.List[str], candidates: tp.List[str], user_profile: str = None
+    ) -> int:
+        """
+        Count tokens of the single ranking prompt of all candidates with token_counter.
+        """
+        prompt, _ = self._build_prompt(prev_interactions, candidates, user_profile)
+        return self.token_counter(prompt)
+
+    def num_llm_calls(self, num_candidates: int) -> int:
+        """
+        Count LLM calls needed to rank candidates with the window strategy of the ranker (without retries).
+        """
+        if num_candidates < 2:
+            return 0
+        if self.window_size is None or num_candidates <= self.window_size:
+            return 1
+        if self.window_strategy == "sliding":
+            return sum(1 for start, end in self._sliding_windows(num_candidates) if end - start >= 2)
+
+        num_calls = 0
+        pool_size = num_candidates
+        while pool_size > self.window_size:
+            num_full_groups, last_group_size = divmod(pool_size, self.window_size)
+            # groups with one candidate are not sent to LLM
+            num_calls += num_full_groups + int(last_group_size >= 2)
+            pool_size = num_full_groups * self.window_stride + min(last_group_size, self.window_stride)
+        return num_calls + int(pool_size >= 2)
+
+    async def arecommend(
+        self,
+        prev_interactions: tp.List[str],
+        candidates: tp.List[str],
+        user_profile: str = None,
+        semaphore: asyncio.Semaphore = None,
+    ) -> tp.List[tp.Any]:
+        """
+        Asynchronous version of recommend that sends the ranking prompt with llm.ainvoke.
+        """
+        if self.window_size is not None and len(candidates) > self.window_size:
+            semaphore = semaphore if semaphore is not None else asyncio.Semaphore(self.max_concurrency)
+            if self.window_strategy == "sliding":
+                return await self._asliding_window_rank(prev_interactions, candidates, user_profile, semaphore)
+            return await self._atournament_rank(prev_interactions, candidates, user_profile, semaphore)
+        prompt, candidate_items_texts = self._build_prompt(prev_interactions, candidates, user_profile)
+        return await self._arank_prompt(prompt, candidates, candidate_items_texts, semaphore)
+
+    def _rank_window(self, prev_interactions: tp.List[str], candidates: tp.List[str], user_profile: str) -> tp.List[tp.Any]:
+        if len(candidates) < 2:
+            return list(candidates)
+        prompt, candidate_items_texts = self._build_prompt(prev_interactions, candidates, user_profile)
+        return self._rank_prompt(prompt, candidates, candidate_items_texts)
+
+    async def _arank_window(
+        self,
+        prev_interactions: tp.List[str],
+        candidates: tp.List[str],
+        user_profile: str,
+        semaphore: asyncio.Semaphore,
+    ) -> tp.List[tp.Any]:
+        if len(candidates) < 2:
+            return list(candidates)
+        prompt, candidate_items_texts = self._build_prompt(prev_interactions, candidates, user_profile)
+        return await self._arank_prompt(prompt, candidates, candidate_items_texts, semaphore)
+
+    def _sliding_windows(self, num_candidates: int) -> tp.Iterator[tp.Tuple[int, int]]:
+        """
+        Yield windows of window_size moving by window_stride from the end of the list to the beginning.
+        Each window depends on the previous one, so the windows are ranked sequentially.
+        """
+        end = num_candidates
+        while True:
+            start = max(0, end - self.window_size)
+            yield start, end
+            if start == 0:
+                return
+            end -= self.window_stride
+
+    def _sliding_window_rank(
+        self, prev_interactions: tp.List[str], candidates: tp.List[str], user_profile: str
+    ) -> tp.List[tp.Any]:
+        ranked = list(candidates)
+        for start, end in self._sliding_windows(len(ranked)):
+            ranked[start:end] = self._rank_window(prev_interactions, ranked[start:end], user_profile)
+        return ranked
+
+    async def _asliding_window_rank(
+        self,
+        prev_interactions: tp.List[str],
+        candidates: tp.List[str],
+        user_profile: str,
+        semaphore: asyncio.Semaphore,
+    ) -> tp.List[tp.Any]:
+        ranked = list(candidates)
+        for start, end in self._sliding_windows(len(ranked)):
+            ranked[start:end] = await self._arank_window(prev_interactions, ranked[start:end], user_profile, semaphore)
+        return ranked
+
+    def _tournament_groups(self, pool: tp.List[tp.Any]) -> tp.List[tp.List[tp.Any]]:
+        return [pool[start : start + self.window_size] for start in range(0, len(pool), self.window_size)]
+
+    def _tournament_round(
+        self, ranked_groups: tp.List[tp.List[tp.Any]]
+    ) -> tp.Tuple[tp.List[tp.Any], tp.List[tp.Any]]:
+        """
+        Split ranked groups of tournament round into window_stride winners of each group advancing to
+        the next round and eliminated candidates. Eliminated candidates are interleaved by rank in group,
+        so the second places of all groups come before the third ones.
+        """
+        pool = [item for group in ranked_groups for item in group[: self.window_stride]]
+        eliminated = []
+        for rank in range(self.window_stride, self.window_size):
+            eliminated.extend(group[rank] for group in ranked_groups if rank < len(group))
+        return pool, eliminated
+
+    def _tournament_rank(
+        self, prev_interactions: tp.List[str], candidates: tp.List[str], user_profile: str
+    ) -> tp.List[tp.Any]:
+        """
+        Rank candidates with tournament: the groups of window_size candidates are ranked in parallel
+        and window_stride best candidates of each group advance to the next round. Candidates eliminated
+        in later rounds are placed higher, inside the round they are ordered by their rank in groups.
+        Groups of the round are ranked by at most max_concurrency threads with blocking LLM calls.
+        """
+        pool = list(candidates)
+        eliminated_rounds = []
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            while len(pool) > self.window_size:
+                ranked_groups = list(
+                    executor.map(
+                        lambda group: self._rank_window(prev_interactions, group, user_profile),
+                        self._tournament_groups(pool),
+                    )
+                )
+                pool, eliminated = self._tournament_round(ranked_groups)
+                eliminated_rounds.append(eliminated)
+
+        ranked = self._rank_window(prev_interactions, pool, user_profile)
+        for eliminated in reversed(eliminated_rounds):
+            ranked.extend(eliminated)
+        return ranked
+
+    async def _atournament_rank(
+        self,
+        prev_interactions: tp.List[str],
+        candidates: tp.List[str],
+        user_profile: str,
+        semaphore: asyncio.Semaphore,
+    ) -> tp.List[tp.Any]:
+        """
+        Asynchronous version of _tournament_rank, where the groups of the round are ranked concurrently.
+        """
+        pool = list(candidates)
+        eliminated_rounds = []
+        while len(pool) > self.window_size:
+            ranked_groups = await asyncio.gather(
+                *[
+                    self._arank_window(prev_interactions, group, user_profile, semaphore)
+                    for group in self._tournament_groups(pool)
+                ]
+            )
+            pool, eliminated = self._tournament_round(ranked_groups)
+            eliminated_rounds.append(eliminated)
+
+        ranked = await self._arank_window(prev_interactions, pool, user_profile, semaphore)
+        for eliminated in reversed(eliminated_rounds):
+            ranked.extend(eliminated)
+        return ranked
+
+    async def arecommend_batch(
+        self,
+        prev_interactions: tp.List[tp.List[str]],
+        candidates: tp.List[tp.List[str]],
+        user_profiles: tp.List[str] = None,
+    ) -> tp.List[tp.List[tp.Any]]:
+        """
+        Rank candidates for several users concurrently. At most max_concurrency requests are sent
+        at once and the requests rate is limited by requests_per_minute.
+
+        Args:
+            prev_interactions (List[List[str]]): The item ids of previous interactions for each user.
+            candidates (List[List[str]]): The item ids of candidates for each user.
+            user_profiles (List[str], optional): The profiles of users. Defaults to None.
+
+        Returns:
+            List[List[Any]]: Ranked candidates for each user in the order of input users.
+        """
+        if user_profiles is None:
+            user_profiles = [None] * len(prev_interactions)
+        if not (len(prev_interactions) == len(candidates) == len(user_profiles)):
+            raise ValueError(
+                "The number of previous interactions, candidates and user profiles should be the same. "
+                + f"Got: {len(prev_interactions)}, {len(candidates)} and {len(user_profiles)}"
+            )
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        return await asyncio.gather(
+            *[
+                self.arecommend(user_history, user_candidates, user_profile, semaphore=semaphore)
+                for user_history, user_candidates, user_profile in zip(prev_interactions, candidates, user_profiles)
+            ]
+        )
+
+    def recommend_batch(
+        self,
+        prev_interactions: tp.List[tp.List[str]],
+        candidates: tp.List[tp.List[str]],
+        user_profiles: tp.List[str] = None,
+    ) -> tp.List[tp.List[tp.Any]]:
+        """
+        Blocking version of arecommend_batch. It could be called from code with running event loop
+        (e.g. notebooks), then the batch is executed in a separate thread.
+        """
+        return self._run_sync(self.arecommend_batch(prev_interactions, candidates, user_profiles))
+
+    @staticmethod
+    def _run_sync(coroutine: tp.Coroutine) -> tp.Any:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+
+        result = {}
+
+        def run_in_thread():
+            try:
+                result["value"] = asyncio.run(coroutine)
+            except Exception as error:
+                result["error"] = error
+
+        thread = threading.Thread(target=run_in_thread)
+        thread.start()
+        thread.join()
+        if "error" in result:
+            raise result["error"]
+        return result["value"]
@@ -0,0 +1,265 @@
+import typing as tp
+import copy
+import warnings
+
+import torch
+import torch.nn.functional as F
+
+from llm4rec.tasks.base_recommender import Recommender
+from llm4rec.tasks.ranking.general_ranker import RankerRecommender
+from llm4rec.utils.cache import LRUCache
+
+
+class LikelihoodRanker(Recommender):
+    """
+    Ranker for local causal language models (e.g. AutoModelForCausalLM from transformers) which scores
+    candidates by their log-likelihood as continuation of the prompt with user history instead of generating
+    and parsing free-text ranking. The prompt is encoded once, its key-value cache is reused
+    for all candidates and candidates are scored in batched forward passes.
+
+    The prompt is encoded by segments: the static instruction before the history, the user profile, the history
+    and the rest. Key-value states of each prefix are kept in a bounded cache, so the static instruction is encoded
+    once for all users and the profile with the history once for all windows and repeated rankings of the user.
+
+    Attributes:
+        model: Causal language model returning logits and past_key_values.
+        tokenizer: Tokenizer of the model.
+        prompt (str): Template of the prompt candidates are continuations of.
+        scoring (str): What is scored as continuation of the prompt: candidate titles or candidate labels.
+        length_normalize (bool): Whether scores are averaged over continuation tokens.
+        batch_size (int): The number of candidates in one forward pass.
+        prefix_cache (Optional[LRUCache]): Cache of key-value states of encoded prompt prefixes.
+    """
+
+    scoring_types = ["title", "label"]
+    default_prompts = {
+        "title": "I've been interested in the following items in the past in order:\n{prev_interactions}.\n\n"
+        + "The next item I would like to interact with is:",
+        "label": "I've been interested in the following items in the past in order:\n{prev_interactions}.\n\n"
+        + "Now there are {num_candidates} candidate items that I may be interested in:\n{candidates}.\n"
+        + "The number of the item I would like to interact with next is:",
+    }
+
+    def __init__(
+        self,
+        model: tp.Any,
+        tokenizer: tp.Any,
+        item2text: tp.Callable,
+        scoring: str = "title",
+        custom_prompt: str = None,
+        length_normalize: bool = True,
+        batch_size: int = 16,
+        item2title: tp.Callable = None,
+        prefix_cache_size: int = 32,
+        prefix_cache_mb: float = None,
+    ) -> None:
+        """
+        Initializes LikelihoodRanker.
+
+        Args:
+            model: Causal language model, e.g. transformers.AutoModelForCausalLM.
+            tokenizer: Tokenizer of the model.
+            item2text (Callable): The function returning text of item by its id, used for user history.
+            scoring (str): Available options: ['title', 'label']. 'title' scores the likelihood of candidate title
+                after the history prompt. 'label' lists numbered candidates in the prompt and scores the likelihood
+                of their numbers terminated by dot (" 1.", " 2.", ...). Defaults to 'title'.
+            custom_prompt (str, optional): Custom prompt template with {prev_interactions} field
+                and {candidates}, {num_candidates} fields for 'label' scoring.
+            length_normalize (bool): Whether to average log-probabilities over continuation tokens,
+                so long titles are not penalized. Labels are never normalized. Defaults to True.
+            batch_size (int): The number of candidates in one forward pass. Defaults to 16.
+            item2title (Callable, optional): The function returning title of item by its id.
+                Defaults to the first field of item2text output.
+            prefix_cache_size (int): The maximum number of cached prompt prefixes. 0 disables caching. Defaults to 32.
+            prefix_cache_mb (float, optional): The maximum total size of cached key-value states in megabytes.
+                Defaults to None (bounded by prefix_cache_size only).
+        """
+        if scoring not in self.scoring_types:
+            raise ValueError(f"The type of scoring should be one of: {self.scoring_types}. Got: {scoring}")
+        self.model = model.eval()
+        self.tokenizer = tokenizer
+        self.item2text = item2text
+        self.item2title = (
+            item2title if item2title is not None else lambda item_id: RankerRecommender._candidate_title(item2text(item_id))
+        )
+        self.scoring = scoring
+        self.prompt = custom_prompt if custom_prompt else self.default_prompts[scoring]
+        self.length_normalize = length_normalize
+        self.batch_size = batch_size
+
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+        if self.pad_token_id is None:
+            self.pad_token_id = 0
+
+        self.prefix_cache = None
+        if prefix_cache_size > 0:
+            self.prefix_cache = LRUCache(
+                max_entries=prefix_cache_size, max_size_mb=prefix_cache_mb, size_fn=self._prefix_nbytes
+            )
+
+    @property
+    def device(self) -> torch.device:
+        return next(self.model.parameters()).device
+
+    def _build_prompt_segments(
+        self, prev_interactions: tp.List[str], candidate_titles: tp.List[str], user_profile: str = None
+    ) -> tp.List[str]:
+        """
+        Build the prompt split into segments which are shared by different rankings: the instruction
+        before the history, the user profile, the history and the rest of the prompt. The profile is separate
+        from the instruction, so the instruction segment is the same for all users.
+        """
+        if len(prev_interactions) < 1:
+            warnings.warn(f"User should have previous interaction data available for ranking")
+        fields = dict(
+            prev_interactions=",\n".join([self.item2text(item_id) for item_id in prev_interactions]),
+            num_candidates=len(candidate_titles),
+            candidates=",\n".join([f"{idx + 1}. {title}" for idx, title in enumerate(candidate_titles)]),
+        )
+        profile_prefix = "My profile: " + user_profile + ".\n" if user_profile is not None else ""
+        if "{prev_interactions}" not in self.prompt:
+            return [profile_prefix + self.prompt.format(**fields)]
+        head, tail = self.prompt.split("{prev_interactions}", 1)
+        return [head.format(**fields), profile_prefix, fields["prev_interactions"], tail.format(**fields)]
+
+    def _continuations(self, candidate_titles: tp.List[str]) -> tp.List[tp.List[int]]:
+        if self.scoring == "label":
+            # labels are terminated as in the numbered list of the prompt, otherwise " 1" is a prefix of " 10"
+            texts = [f" {idx + 1}." for idx in range(len(candidate_titles))]
+        else:
+            texts = [f" {title}" for title in candidate_titles]
+        return [self.tokenizer(text, add_special_tokens=False)["input_ids"] for text in texts]
+
+    @staticmethod
+    def _prefix_nbytes(prefix: tp.Tuple[tp.Any, torch.Tensor, int]) -> int:
+        past_key_values, next_log_probs, _ = prefix
+        try:
+            past_nbytes = sum(
+                tensor.numel() * tensor.element_size() for layer in past_key_values for tensor in layer if torch.is_tensor(tensor)
+            )
+        except TypeError:
+            past_nbytes = 0
+        return past_nbytes + next_log_probs.numel() * next_log_probs.element_size()
+
+    @staticmethod
+    def _copy_past(past_key_values: tp.Any) -> tp.Any:
+        # Cache objects are extended in-place by the forward pass, legacy tuples are not
+        if past_key_values is None or isinstance(past_key_values, tuple):
+            return past_key_values
+        return copy.deepcopy(past_key_values)
+
+    @torch.no_grad()
+    def _encode_prefix(self, segments: tp.List[str]) -> tp.Tuple[tp.Any, torch.Tensor, int]:
+        """
+        Run the model on the prompt segments starting from the longest cached prefix.
+
+        Returns:
+            Tuple[Any, torch.Tensor, int]: Key-value cache of the prompt, log-probabilities of the next token
+                and the length of the prompt in tokens.
+        """
+        past_key_values, next_log_probs, prefix_len = None, None, 0
+        num_cached = 0
+        if self.prefix_cache is not None:
+            for num_segments in range(len(segments), 0, -1):
+                cached = self.prefix_cache.get(tuple(segments[:num_segments]))
+                if cached is not None:
+                    past_key_values, next_log_probs, prefix_len = cached
+                    num_cached = num_segments
+                    break
+
+        for num_segments in range(num_cached + 1, len(segments) + 1):
+            segment_ids = self.tokenizer(
+                segments[num_segments - 1], add_special_tokens=prefix_len == 0, return_tensors="pt"
+            )["input_ids"].to(self.device)
+            if segment_ids.shape[1] == 0:
+                continue
+            output = self.model(
+                input_ids=segment_ids, past_key_values=self._copy_past(past_key_values), use_cache=True
+            )
+            past_key_values = output.past_key_values
+            next_log_probs = F.log_softmax(output.logits[0, -1].float(), dim=-1)
+            prefix_len += segment_ids.shape[1]
+            if self.prefix_cache is not None:
+                self.prefix_cache.set(tuple(segments[:num_segments]), (past_key_values, next_log_probs, prefix_len))
+        return past_key_values, next_log_probs, prefix_len
+
+    @staticmethod
+    def _expand_past(past_key_values: tp.Any, batch_size: int) -> tp.Any:
+        # Cache objects are updated in-place by the forward pass, so the shared prefix cache is copied
+        if hasattr(past_key_values, "batch_repeat_interleave"):
+            past_key_values = LikelihoodRanker._copy_past(past_key_values)
+            past_key_values.batch_repeat_interleave(batch_size)
+            return past_key_values
+        return tuple(
+            tuple(tensor.expand(batch_size, *tensor.shape[1:]) for tensor in layer) for layer in past_key_values
+        )
+
+    @torch.no_grad()
+    def _score_continuations(
+        self, past_key_values: tp.Any, next_log_probs: torch.Tensor, prefix_len: int, continuations: tp.List[tp.List[int]]
+    ) -> torch.Tensor:
+        scores = torch.full((len(continuations),), float("-inf"))
+        for start in range(0, len(continuations), self.batch_size):
+            batch = [(idx, ids) for idx, ids in enumerate(continuations[start : start + self.batch_size], start) if ids]
+            if len(batch) == 0:
+                continue
+            lengths = torch.tensor([len(ids) for _, ids in batch], device=self.device)
+            max_len = int(lengths.max())
+            input_ids = torch.full((len(batch), max_len), self.pad_token_id, dtype=torch.long, device=self.device)
+            for row, (_, ids) in enumerate(batch):
+                input_ids[row, : len(ids)] = torch.tensor(ids, device=self.device)
+            mask = torch.arange(max_len, device=self.device).unsqueeze(0) < lengths.unsqueeze(1)
+
+            # the first token is predicted by the prompt, the rest by the continuation itself
+            token_log_probs = torch.zeros(len(batch), max_len, device=self.device)
+            token_log_probs[:, 0] = next_log_probs[input_ids[:, 0]]
+            if max_len > 1:
+                attention_mask = torch.cat(
+                    [torch.ones(len(batch), prefix_len, dtype=torch.long, device=self.device), mask[:, :-1].long()],
+                    dim=1,
+                )
+                output = self.model(
+                    input_ids=input_ids[:, :-1],
+                    attention_mask=attention_mask,
+                    past_key_values=self._expand_past(past_key_values, len(batch)),
+                    use_cache=True,
+                )
+                log_probs = F.log_softmax(output.logits.float(), dim=-1)
+                token_log_probs[:, 1:] = log_probs.gather(-1, input_ids[:, 1:].unsqueeze(-1)).squeeze(-1)
+
+            batch_scores = (token_log_probs * mask).sum(dim=1)
+            # labels are alternatives of one answer, their full log-probabilities are compared without normalization
+            if self.length_normalize and self.scoring != "label":
+                batch_scores = batch_scores / lengths
+            scores[[idx for idx, _ in batch]] = batch_scores.cpu()
+        return scores
+
+    def score(
+        self, prev_interactions: tp.List[str], candidates: tp.List[str], user_profile: str = None
+    ) -> torch.Tensor:
+        """
+        Compute log-likelihood scores of candidates for the user.
+
+        Args:
+            prev_interactions (List[str]): The item ids of previous interactions.
+            candidates (List[str]): The item ids of candidates.
+            user_profile (str, optional): The profile of the user.
+
+        Returns:
+            torch.Tensor: The scores of candidates in the input order (the higher the better).
+        """
+        candidate_titles = [self.item2title(item_id) for item_id in candidates]
+        segments = self._build_prompt_segments(prev_interactions, candidate_titles, user_profile)
+        past_key_values, next_log_probs, prefix_len = self._encode_prefix(segments)
+        return self._score_continuations(
+            past_key_values, next_log_probs, prefix_len, self._continuations(candidate_titles)
+        )
+
+    def recommend(
+        self, prev_interactions: tp.List[str], candidates: tp.List[str], user_profile: str = None
+    ) -> tp.List[tp.Any]:
+        if len(candidates) < 2:
+            return list(candidates)
+        scores = self.score(prev_interactions, candidates, user_profile)
+        order = torch.argsort(-scores, stable=True).tolist()
+        return [candidates[idx] for idx in order]
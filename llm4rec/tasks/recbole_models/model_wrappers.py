@@ -47,13 +47,31 @@ class SequentialRecBoleModelWrapper(Recommender):
         self.item_token2id = lambda x: dataset.token2id(self.model.ITEM_ID, x)
 
 
-    def recommend(self, prev_interactions: tp.List[str], candidates: tp.List[str] = None) -> tp.List[str]:
+    def _full_scores(self, prev_interactions: tp.List[str]) -> torch.Tensor:
         prev_interaction_ids = [self.item_token2id(token) for token in prev_interactions]
         new_inter = {
             self.model.ITEM_SEQ: torch.tensor(prev_interaction_ids).unsqueeze(0),
             self.model.ITEM_SEQ_LEN: torch.tensor(len(prev_interactions))
         }
-        scores = self.model.full_sort_predict(Interaction(new_inter)).squeeze()
+        return self.model.full_sort_predict(Interaction(new_inter)).squeeze()
+
+    @torch.no_grad()
+    def score(self, prev_interactions: tp.List[str], candidates: tp.List[str]) -> torch.Tensor:
+        """
+        Score candidates with the sequential model, e.g. as a cheap scorer in CascadeRanker.
+
+        Args:
+            prev_interactions (List[str]): The item tokens of previous interactions.
+            candidates (List[str]): The item tokens of candidates.
+
+        Returns:
+            torch.Tensor: The scores of candidates in the input order.
+        """
+        candidate_ids = [self.item_token2id(token) for token in candidates]
+        return self._full_scores(prev_interactions)[candidate_ids]
+
+    def recommend(self, prev_interactions: tp.List[str], candidates: tp.List[str] = None) -> tp.List[str]:
+        scores = self._full_scores(prev_interactions)
 
         if candidates is not None:
             candidate_ids = [self.item_token2id(token) for token in candidates]
@@ -1,7 +1,17 @@
 from llm4rec.utils.file_embeddings import EmbeddingsFromFile
-from llm4rec.utils.prompt_building import prepare_input_per_users
+from llm4rec.utils.prompt_building import prepare_input_per_users, get_token_counter
+from llm4rec.utils.cache import BaseCache, LRUCache, SQLiteCache
+from llm4rec.utils.rate_limit import TokenBucket, retry_with_backoff, aretry_with_backoff, is_retryable_error
 
 __all__ = [
     "EmbeddingsFromFile",
-    "prepare_input_per_users"
+    "prepare_input_per_users",
+    "get_token_counter",
+    "BaseCache",
+    "LRUCache",
+    "SQLiteCache",
+    "TokenBucket",
+    "retry_with_backoff",
+    "aretry_with_backoff",
+    "is_retryable_error"
 ]
\ No newline at end of file
@@ -0,0 +1,246 @@
+import os
+import sys
+import time
+import pickle
+import sqlite3
+import threading
+import typing as tp
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+def _default_size(value: tp.Any) -> int:
+    # numpy arrays and torch tensors report the size of their buffers
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+class BaseCache(ABC):
+    """
+    Base class for caches of computed values.
+
+    Attributes:
+        hits (int): The number of successful lookups.
+        misses (int): The number of failed lookups.
+    """
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def get(self, key: tp.Hashable, default: tp.Any = None) -> tp.Any:
+        """
+        Return cached value or default if the key is missing or expired.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: tp.Hashable, value: tp.Any) -> None:
+        """
+        Store value in the cache.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    @property
+    def stats(self) -> tp.Dict[str, float]:
+        """
+        Return usage statistics of the cache.
+
+        Returns:
+            Dict[str, float]: The number of hits, misses, hit rate and number of entries.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+            "entries": len(self),
+        }
+
+
+class LRUCache(BaseCache):
+    """
+    Thread-safe in-memory cache with least-recently-used eviction.
+
+    Attributes:
+        max_entries (Optional[int]): The maximum number of stored values.
+        max_size_mb (Optional[float]): The maximum total size of stored keys and values in megabytes.
+        ttl (Optional[float]): The time in seconds after which the value expires.
+        hits (int): The number of successful lookups.
+        misses (int): The number of failed lookups.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = None,
+        max_size_mb: float = None,
+        ttl: float = None,
+        size_fn: tp.Callable[[tp.Any], int] = _default_size,
+    ) -> None:
+        """
+        Initializes LRUCache.
+
+        Args:
+            max_entries (int, optional): The maximum number of stored values. Defaults to None (unbounded).
+            max_size_mb (float, optional): The maximum total size of the cache in megabytes. Defaults to None (unbounded).
+            ttl (float, optional): The time in seconds after which the value expires. Defaults to None (never).
+            size_fn (Callable, optional): The function returning the size of a value in bytes.
+        """
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_size_mb = max_size_mb
+        self.ttl = ttl
+        self.size_fn = size_fn
+        self._size_bytes = 0
+        # key -> (value, size in bytes, insertion time)
+        self._store = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tp.Hashable, default: tp.Any = None) -> tp.Any:
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[2] > self.ttl:
+                self._pop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._store.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: tp.Hashable, value: tp.Any) -> None:
+        size = self.size_fn(value) + sys.getsizeof(key)
+        with self._lock:
+            if key in self._store:
+                self._pop(key)
+            if self.max_size_mb is not None and size > self.max_size_mb * 2**20:
+                # the value would evict everything and still not fit
+                return
+            self._store[key] = (value, size, time.monotonic())
+            self._size_bytes += size
+            self._evict()
+
+    def _pop(self, key: tp.Hashable) -> None:
+        _, size, _ = self._store.pop(key)
+        self._size_bytes -= size
+
+    def _evict(self) -> None:
+        while len(self._store) > 0 and (
+            (self.max_entries is not None and len(self._store) > self.max_entries)
+            or (self.max_size_mb is not None and self._size_bytes > self.max_size_mb * 2**20)
+        ):
+            self._pop(next(iter(self._store)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._store.clear()
+            self._size_bytes = 0
+
+    def __contains__(self, key: tp.Hashable) -> bool:
+        return key in self._store
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    @property
+    def stats(self) -> tp.Dict[str, float]:
+        """
+        Return usage statistics of the cache.
+
+        Returns:
+            Dict[str, float]: The number of hits, misses, hit rate, number of entries and size in megabytes.
+        """
+        return {**super().stats, "size_mb": self._size_bytes / 2**20}
+
+
+class SQLiteCache(BaseCache):
+    """
+    Persistent cache stored in local SQLite database with least-recently-used eviction.
+    Keys are stored as strings and values are pickled.
+
+    Attributes:
+        path (str): The path to database file.
+        max_entries (Optional[int]): The maximum number of stored values.
+        ttl (Optional[float]): The time in seconds after which the value expires.
+    """
+
+    def __init__(self, path: str, max_entries: int = None, ttl: float = None) -> None:
+        """
+        Initializes SQLiteCache.
+
+        Args:
+            path (str): The path to database file. It is created if it does not exist.
+            max_entries (int, optional): The maximum number of stored values. Defaults to None (unbounded).
+            ttl (float, optional): The time in seconds after which the value expires. Defaults to None (never).
+        """
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value BLOB, created REAL, accessed REAL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+
+    def get(self, key: tp.Hashable, default: tp.Any = None) -> tp.Any:
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT value, created FROM cache WHERE key = ?", (str(key),)
+            ).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self._connection.execute("DELETE FROM cache WHERE key = ?", (str(key),))
+                row = None
+            if row is None:
+                self.misses += 1
+                return default
+            self._connection.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, str(key)))
+            self.hits += 1
+        return pickle.loads(row[0])
+
+    def set(self, key: tp.Hashable, value: tp.Any) -> None:
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (str(key), pickle.dumps(value), now, now),
+            )
+            if self.max_entries is not None:
+                self._connection.execute(
+                    "DELETE FROM cache WHERE key IN "
+                    "(SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM cache")
+
+    def __contains__(self, key: tp.Hashable) -> bool:
+        with self._lock:
+            row = self._connection.execute("SELECT 1 FROM cache WHERE key = ?", (str(key),)).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def close(self) -> None:
+        self._connection.close()
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import pickle
+import typing as tp
+
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+
+def file_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """
+    Compute sha256 hash of the file content.
+
+    Args:
+        file_path (str): Path to the file.
+        block_size (int): Size of the blocks the file is read with.
+    """
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def index_cache_key(**key_parts: tp.Any) -> str:
+    """
+    Build content-addressed key for the vector index from all parameters that
+    influence its content (data hash, embedding model, splitter arguments, ...).
+    """
+    serialized = json.dumps(key_parts, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def embeddings_fingerprint(embeddings: Embeddings) -> tp.Optional[tp.Dict[str, tp.Any]]:
+    """
+    Describe embeddings by everything that changes the vectors of documents: the hash of embeddings file
+    for file-based embeddings, the model name and encoder settings for model-based embeddings.
+
+    Args:
+        embeddings (Embeddings): The embeddings model.
+
+    Returns:
+        Optional[Dict[str, Any]]: The fingerprint or None if the identity of embeddings could not be determined.
+    """
+    emb_file_path = getattr(embeddings, "emb_file_path", None)
+    if emb_file_path is not None:
+        return {"class": type(embeddings).__name__, "emb_file_hash": file_hash(emb_file_path)}
+
+    model_name = getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None)
+    if not isinstance(model_name, str):
+        return None
+    fingerprint = {"class": type(embeddings).__name__, "model_name": model_name}
+    for attr in ["model_kwargs", "encode_kwargs", "embed_instruction", "dimensions"]:
+        value = getattr(embeddings, attr, None)
+        if attr == "model_kwargs" and isinstance(value, dict):
+            # the device does not change the vectors
+            value = {key: item for key, item in value.items() if key != "device"}
+        if value is not None:
+            fingerprint[attr] = value
+    return fingerprint
+
+
+def save_vectorstore(vectorstore: FAISS, folder_path: str, index_name: str = "index") -> None:
+    """
+    Save FAISS vectorstore to disk. The layout is the same as in FAISS.save_local,
+    so saved indexes could be loaded with FAISS.load_local as well.
+
+    Args:
+        vectorstore (FAISS): The vectorstore to save.
+        folder_path (str): The directory to save index to.
+        index_name (str): The name of index files.
+    """
+    os.makedirs(folder_path, exist_ok=True)
+    # write to temporary files first so interrupted saves never look like valid cache entries
+    index_path = os.path.join(folder_path, f"{index_name}.faiss")
+    docstore_path = os.path.join(folder_path, f"{index_name}.pkl")
+    faiss.write_index(vectorstore.index, index_path + ".tmp")
+    with open(docstore_path + ".tmp", "wb") as f:
+        pickle.dump((vectorstore.docstore, vectorstore.index_to_docstore_id), f)
+    os.replace(docstore_path + ".tmp", docstore_path)
+    os.replace(index_path + ".tmp", index_path)
+
+
+def vectorstore_exists(folder_path: str, index_name: str = "index") -> bool:
+    return os.path.isfile(os.path.join(folder_path, f"{index_name}.faiss")) and os.path.isfile(
+        os.path.join(folder_path, f"{index_name}.pkl")
+    )
+
+
+def read_index(index_path: str, mmap: bool = True) -> tp.Tuple[faiss.Index, bool]:
+    """
+    Read FAISS index, memory-mapping its vectors where FAISS supports it. IO_FLAG_MMAP maps only
+    the inverted lists of IVF indexes, the codes of flat indexes (also the storage of HNSW) are mapped
+    with IO_FLAG_MMAP_IFC, which is available only in recent FAISS versions. The HNSW graph
+    and everything not covered by these flags is always read to RAM.
+
+    Args:
+        index_path (str): The path to index file.
+        mmap (bool): Whether to memory-map the index file.
+
+    Returns:
+        Tuple[faiss.Index, bool]: The index and whether its vectors are actually memory-mapped (read-only).
+    """
+    if mmap:
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        try:
+            index = faiss.read_index(index_path, flags)
+        except RuntimeError:
+            # not every index type supports memory-mapping
+            index = None
+        if index is not None:
+            try:
+                faiss.extract_index_ivf(index)
+                is_ivf = True
+            except RuntimeError:
+                is_ivf = False
+            return index, is_ivf or hasattr(faiss, "IO_FLAG_MMAP_IFC")
+    return faiss.read_index(index_path), False
+
+
+def load_vectorstore(
+    folder_path: str,
+    embeddings: Embeddings,
+    index_name: str = "index",
+    mmap: bool = True,
+    **kwargs: tp.Any,
+) -> tp.Tuple[FAISS, bool]:
+    """
+    Load FAISS vectorstore from disk. The vectors of index are memory-mapped where possible (see read_index),
+    so they are paged in lazily by the OS instead of being copied to RAM.
+
+    Args:
+        folder_path (str): The directory with saved index.
+        embeddings (Embeddings): The embeddings model for the vectorstore.
+        index_name (str): The name of index files.
+        mmap (bool): Whether to memory-map the index file.
+        kwargs: Additional arguments for FAISS vectorstore.
+
+    Returns:
+        Tuple[FAISS, bool]: The vectorstore and whether its index is memory-mapped.
+    """
+    index, mmapped = read_index(os.path.join(folder_path, f"{index_name}.faiss"), mmap=mmap)
+    with open(os.path.join(folder_path, f"{index_name}.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id, **kwargs), mmapped
@@ -32,6 +32,8 @@ class EmbeddingsFromFile(Embeddings):
         if not os.path.exists(emb_file_path):
             raise ValueError("Wrong path to embeddings file")
 
+        self.emb_file_path = emb_file_path
+
         with np.load(emb_file_path) as emb_data:
             assert sorted(list(emb_data.keys())) == sorted(['user_factors', 'item_factors', 'user_ids', 'item_ids'])
             self.user_emb = emb_data['user_factors']
@@ -46,4 +48,8 @@ class EmbeddingsFromFile(Embeddings):
 
     def embed_query(self, text: str) -> List[float]:
         idx = self.user_id_map[text]
-        return self.user_emb[idx]
\ No newline at end of file
+        return self.user_emb[idx]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        idxs = [self.user_id_map[text] for text in texts]
+        return self.user_emb[idxs]
\ No newline at end of file
@@ -8,4 +8,21 @@ def prepare_input_per_users(
     top_k: int
 ) -> str:
     
-    return prompt.format(user_profile=user_profile, item_ids_with_meta=prev_interactions, top_k=top_k)
\ No newline at end of file
+    return prompt.format(user_profile=user_profile, item_ids_with_meta=prev_interactions, top_k=top_k)
+
+def get_token_counter(encoding_name: str = "cl100k_base") -> tp.Callable[[str], int]:
+    """
+    Return function counting tokens of text with tiktoken encoding.
+    If tiktoken or the encoding is unavailable, tokens are estimated as 4 characters per token.
+
+    Args:
+        encoding_name (str): The name of tiktoken encoding.
+    """
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding(encoding_name)
+    except Exception:
+        # tiktoken is not installed or could not download the encoding
+        return lambda text: (len(text) + 3) // 4
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
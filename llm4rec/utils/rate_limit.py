@@ -0,0 +1,138 @@
+import time
+import random
+import asyncio
+import threading
+import typing as tp
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter shared between threads and event loops.
+
+    Attributes:
+        rate (float): The number of tokens added per second.
+        capacity (float): The maximum number of tokens, i.e. the allowed burst size.
+    """
+
+    def __init__(self, rate: float, capacity: float = None) -> None:
+        """
+        Initializes TokenBucket.
+
+        Args:
+            rate (float): The number of tokens added per second, e.g. requests_per_minute / 60.
+            capacity (float, optional): The maximum burst size. Defaults to max(rate, 1).
+        """
+        if rate <= 0:
+            raise ValueError(f"The rate of token bucket should be positive. Got: {rate}")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: float) -> float:
+        """
+        Take tokens from the bucket and return the time to wait until they are available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        wait_time = self._reserve(tokens)
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    async def aacquire(self, tokens: float = 1.0) -> None:
+        wait_time = self._reserve(tokens)
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Check whether the error of LLM call is transient: rate limit, timeout, connection or server (5xx) error.
+    Other errors (authentication, bad request, context length, programming errors) are not retried.
+    """
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    error_name = type(error).__name__
+    if any(name in error_name for name in ["RateLimit", "Timeout", "APIConnection", "InternalServer", "ServiceUnavailable"]):
+        return True
+    # providers' clients keep the HTTP status in the error or in its response
+    status_code = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if status_code is None and response is not None:
+        status_code = getattr(response, "status_code", None)
+    return isinstance(status_code, int) and (status_code == 429 or status_code >= 500)
+
+
+def _retry_delay(error: Exception, attempt: int, base_delay: float, max_delay: float) -> float:
+    # providers report the time to wait on rate limit errors, it is used when available
+    retry_after = getattr(error, "retry_after", None)
+    response = getattr(error, "response", None)
+    if retry_after is None and response is not None and hasattr(response, "headers"):
+        retry_after = response.headers.get("retry-after")
+    try:
+        if retry_after is not None:
+            return min(float(retry_after), max_delay)
+    except (TypeError, ValueError):
+        pass
+    return min(base_delay * 2**attempt, max_delay) * (0.5 + random.random() / 2)
+
+
+def retry_with_backoff(
+    fn: tp.Callable[[], tp.Any],
+    max_retries: int = 3,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    retry_on: tp.Callable[[Exception], bool] = is_retryable_error,
+) -> tp.Any:
+    """
+    Call function and retry it with exponential backoff and jitter on transient exceptions.
+
+    Args:
+        fn (Callable): The function without arguments to call.
+        max_retries (int): The number of retries after the first failed call.
+        base_delay (float): The delay in seconds before the first retry.
+        max_delay (float): The maximum delay in seconds between retries.
+        retry_on (Callable[[Exception], bool]): The predicate of errors to retry, other errors are raised at once.
+            Defaults to is_retryable_error.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except Exception as error:
+            if attempt == max_retries or not retry_on(error):
+                raise
+            time.sleep(_retry_delay(error, attempt, base_delay, max_delay))
+
+
+async def aretry_with_backoff(
+    fn: tp.Callable[[], tp.Awaitable[tp.Any]],
+    max_retries: int = 3,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    retry_on: tp.Callable[[Exception], bool] = is_retryable_error,
+) -> tp.Any:
+    """
+    Await coroutine function and retry it with exponential backoff and jitter on transient exceptions.
+
+    Args:
+        fn (Callable): The coroutine function without arguments to call.
+        max_retries (int): The number of retries after the first failed call.
+        base_delay (float): The delay in seconds before the first retry.
+        max_delay (float): The maximum delay in seconds between retries.
+        retry_on (Callable[[Exception], bool]): The predicate of errors to retry, other errors are raised at once.
+            Defaults to is_retryable_error.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return await fn()
+        except Exception as error:
+            if attempt == max_retries or not retry_on(error):
+                raise
+            await asyncio.sleep(_retry_delay(error, attempt, base_delay, max_delay))